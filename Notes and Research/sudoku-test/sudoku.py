@@ -18,55 +18,60 @@ import dimod
 import math
 import sys
 import copy
-import execjs
+import numpy as np
 
-from dimod.generators.constraints import combinations
-from hybrid.reference import KerberosSampler
+import sudoku_generator
 
+def get_matrix(filename=None, difficulty="medium", seed=None):
+    """Return a list of lists containing the Sudoku puzzle, 0 for empty cells.
 
-def get_label(row, col, digit):
-    """Returns a string of the cell coordinates and the cell value in a
-    standard format.
+    The puzzle is read from a text file (one row per line, digits split by
+    whitespace), drawn from a pool file written by sudoku_generator, or,
+    without a filename, generated natively.
     """
-    return "{row},{col}_{digit}".format(**locals())
+    if filename is None:
+        return sudoku_generator.generate(difficulty, seed)
 
-def get_matrix(filename):
-    """Return a list of lists containing the content of the input text file.
+    with open(filename, "rb") as f:
+        is_pool = f.read(len(sudoku_generator.POOL_MAGIC)) == sudoku_generator.POOL_MAGIC
+    if is_pool:
+        return sudoku_generator.read_pool(filename, seed=seed)
 
-    Note: each line of the text file corresponds to a list. Each item in
-    the list is from splitting the line of text by the whitespace ' '.
-    """
-    # with open(filename, "r") as f:
-    #     content = f.readlines()
-
-    # lines = []
-    # for line in content:
-    #     new_line = line.rstrip()    # Strip any whitespace after last value
-
-    #     if new_line:
-    #         new_line = list(map(int, new_line.split(' ')))
-    #         lines.append(new_line)
+    with open(filename, "r") as f:
+        content = f.readlines()
 
-    # return lines
+    lines = []
+    for line in content:
+        new_line = line.rstrip()    # Strip any whitespace after last value
 
-    # Read the JavaScript file content
-    with open(filename, 'r') as file:
-        javascript_code = file.read()
+        if new_line:
+            new_line = list(map(int, new_line.split()))
+            lines.append(new_line)
 
-    # Create an ExecJS context
-    ctx = execjs.compile(javascript_code)
+    return lines
 
-    # Call the generateSudoku function in JavaScript
-    sudoku_board = ctx.call("generateSudoku")
 
-    # Split the Sudoku board into a list of lists (rows)
-    sudoku_rows = [sudoku_board[i:i + 9] for i in range(0, len(sudoku_board), 9)]
+def feasible(onehot):
+    """Check the Sudoku constraints on any number of grids at once.
 
-    # Display the rows (each representing a row of the Sudoku board)
-    for row in sudoku_rows:
-        print(row)
+    Args:
+      onehot(array): shape (..., n, n, n), 1 where cell (row, col) holds
+        digit d + 1.
 
-    return sudoku_rows
+    Returns a boolean array of shape (...), True for grids where every cell
+    holds exactly one digit and every digit appears exactly once in each
+    row, column and sub-square.
+    """
+    onehot = np.asarray(onehot, dtype=np.int64)
+    n = onehot.shape[-1]
+    m = int(math.sqrt(n))
+    lead = onehot.shape[:-3]
+    by_box = (onehot.reshape(lead + (m, m, m, m, n))
+              .swapaxes(-4, -3).reshape(lead + (n, n, n)))
+    return ((onehot.sum(axis=-1) == 1).all(axis=(-2, -1))
+            & (onehot.sum(axis=-2) == 1).all(axis=(-2, -1))
+            & (onehot.sum(axis=-3) == 1).all(axis=(-2, -1))
+            & (by_box.sum(axis=-2) == 1).all(axis=(-2, -1)))
 
 
 def is_correct(matrix):
@@ -76,117 +81,180 @@ def is_correct(matrix):
       matrix(list of lists): list contains 'n' lists, where each of the 'n'
         lists contains 'n' digits.
     """
-    n = len(matrix)        # Number of rows/columns
-    m = int(math.sqrt(n))  # Number of subsquare rows/columns
-    unique_digits = set(range(1, n+1))  # Digits in a solution
-
-    # Verifying rows
-    for row in matrix:
-        if set(row) != unique_digits:
-            print("Error in row: ", row)
-            return False
-
-    # Verifying columns
-    for j in range(n):
-        col = [matrix[i][j] for i in range(n)]
-        if set(col) != unique_digits:
-            print("Error in col: ", col)
-            return False
-
-    # Verifying subsquares
-    subsquare_coords = [(i, j) for i in range(m) for j in range(m)]
-    for r_scalar in range(m):
-        for c_scalar in range(m):
-            subsquare = [matrix[i + r_scalar * m][j + c_scalar * m] for i, j
-                         in subsquare_coords]
-            if set(subsquare) != unique_digits:
-                print("Error in sub-square: ", subsquare)
-                return False
-
-    return True
+    n = len(matrix)
+    return bool(feasible(np.asarray(matrix)[:, :, None] == np.arange(1, n + 1)))
+
+
+def get_candidates(matrix):
+    """Return an n x n x n boolean array, True where digit d + 1 can still go
+    in cell (row, col).
+
+    Given cells have no candidates, and each given digit is removed from the
+    other cells of its row, column and sub-square.
+    """
+    n = len(matrix)
+    m = int(math.sqrt(n))
+    grid = np.asarray(matrix, dtype=np.int64)
+    candidates = np.ones((n, n, n), dtype=bool)
+
+    rows, cols = np.nonzero(grid)
+    digits = grid[rows, cols] - 1
+    candidates[rows, cols, :] = False
+    row_has = np.zeros((n, n), dtype=bool)
+    col_has = np.zeros((n, n), dtype=bool)
+    box_has = np.zeros((n, n), dtype=bool)
+    row_has[rows, digits] = True
+    col_has[cols, digits] = True
+    box_has[(rows // m) * m + cols // m, digits] = True
+
+    box = (np.arange(n)[:, None] // m) * m + np.arange(n)[None, :] // m
+    candidates &= ~row_has[:, None, :]
+    candidates &= ~col_has[None, :, :]
+    candidates &= ~box_has[box]
+    return candidates
+
+
+def propagate(matrix):
+    """Fill in forced digits until none are left, and return the new matrix.
+
+    A digit is forced when it is the only candidate left for a cell (naked
+    single) or the only cell left for it in a row, column or sub-square
+    (hidden single). Raises ValueError if the givens contradict each other.
+    """
+    n = len(matrix)
+    m = int(math.sqrt(n))
+    grid = np.array(matrix, dtype=np.int64)
+    if has_duplicates(grid):
+        raise ValueError("Sudoku has no solution: a given digit is repeated")
+
+    while True:
+        candidates = get_candidates(grid)
+        counts = candidates.sum(axis=2)
+        empty = grid == 0
+        if np.any(empty & (counts == 0)):
+            raise ValueError("Sudoku has no solution")
+
+        # (row, col, digit) of every single found in this pass
+        naked_rows, naked_cols = np.nonzero(empty & (counts == 1))
+        found = [(naked_rows, naked_cols, candidates[naked_rows, naked_cols].argmax(axis=1))]
+        in_row, digits = np.nonzero(candidates.sum(axis=1) == 1)
+        found.append((in_row, candidates[in_row, :, digits].argmax(axis=1), digits))
+        in_col, digits = np.nonzero(candidates.sum(axis=0) == 1)
+        found.append((candidates[:, in_col, digits].argmax(axis=0), in_col, digits))
+        # Regroup as (sub-square, cell within it, digit)
+        by_box = candidates.reshape(m, m, m, m, n).transpose(0, 2, 1, 3, 4).reshape(n, n, n)
+        boxes, digits = np.nonzero(by_box.sum(axis=1) == 1)
+        within = by_box[boxes, :, digits].argmax(axis=1)
+        found.append(((boxes // m) * m + within // m, (boxes % m) * m + within % m, digits))
+
+        rows, cols, digits = (np.concatenate(parts) for parts in zip(*found))
+        if len(rows) == 0:
+            return grid.tolist()
+        grid[rows, cols] = digits + 1
+        # Two singles for the same cell, or the same digit twice in a unit
+        if np.any(grid[rows, cols] != digits + 1) or has_duplicates(grid):
+            raise ValueError("Sudoku has no solution")
+
+
+def has_duplicates(grid):
+    """Return True if a digit appears twice in a row, column or sub-square."""
+    n = len(grid)
+    m = int(math.sqrt(n))
+    onehot = np.asarray(grid)[:, :, None] == np.arange(1, n + 1)
+    by_box = onehot.reshape(m, m, m, m, n).transpose(0, 2, 1, 3, 4).reshape(n, n, n)
+    return bool((onehot.sum(axis=1) > 1).any() or (onehot.sum(axis=0) > 1).any()
+                or (by_box.sum(axis=1) > 1).any())
+
 
 def build_bqm(matrix):
-    """Build BQM using Sudoku constraints"""
-    # Set up
+    """Build BQM using Sudoku constraints.
+
+    Only digits that the givens have not ruled out get a variable; the
+    variable for candidate i is the integer i. Returns the BQM and a
+    (k, 3) array of (row, col, digit) to decode it with.
+
+    Every cell, and every digit in a row, column or sub-square, is a
+    one-hot group: (sum(x) - 1) ** 2 = 1 - sum(x) + 2 * sum(x_i * x_j).
+    Groups that a given already satisfies have no variables left.
+    """
     n = len(matrix)          # Number of rows/columns in sudoku
     m = int(math.sqrt(n))    # Number of rows/columns in sudoku subsquare
-    digits = range(1, n+1)
-
-    bqm = dimod.BinaryQuadraticModel({}, {}, 0.0, dimod.SPIN)
-
-    # Constraint: Each node can only select one digit
-    for row in range(n):
-        for col in range(n):
-            node_digits = [get_label(row, col, digit) for digit in digits]
-            one_digit_bqm = combinations(node_digits, 1)
-            bqm.update(one_digit_bqm)
-
-    # Constraint: Each row of nodes cannot have duplicate digits
-    for row in range(n):
-        for digit in digits:
-            row_nodes = [get_label(row, col, digit) for col in range(n)]
-            row_bqm = combinations(row_nodes, 1)
-            bqm.update(row_bqm)
-
-    # Constraint: Each column of nodes cannot have duplicate digits
-    for col in range(n):
-        for digit in digits:
-            col_nodes = [get_label(row, col, digit) for row in range(n)]
-            col_bqm = combinations(col_nodes, 1)
-            bqm.update(col_bqm)
-
-    # Constraint: Each sub-square cannot have duplicates
-    # Build indices of a basic subsquare
-    subsquare_indices = [(row, col) for row in range(m) for col in range(m)]
-
-    # Build full sudoku array
-    for r_scalar in range(m):
-        for c_scalar in range(m):
-            for digit in digits:
-                # Shifts for moving subsquare inside sudoku matrix
-                row_shift = r_scalar * m
-                col_shift = c_scalar * m
-
-                # Build the labels for a subsquare
-                subsquare = [get_label(row + row_shift, col + col_shift, digit)
-                             for row, col in subsquare_indices]
-                subsquare_bqm = combinations(subsquare, 1)
-                bqm.update(subsquare_bqm)
-
-    # Constraint: Fix known values
-    for row, line in enumerate(matrix):
-        for col, value in enumerate(line):
-            if value > 0:
-                # Recall that in the "Each node can only select one digit"
-                # constraint, for a given cell at row r and column c, we
-                # produced 'n' labels. Namely,
-                # ["r,c_1", "r,c_2", ..., "r,c_(n-1)", "r,c_n"]
-                #
-                # Due to this same constraint, we can only select one of these
-                # 'n' labels (achieved by 'generators.combinations(..)').
-                #
-                # The 1 below indicates that we are selecting the label
-                # produced by 'get_label(row, col, value)'. All other labels
-                # with the same 'row' and 'col' will be discouraged from being
-                # selected.
-                bqm.fix_variable(get_label(row, col, value), 1)
-
-    return bqm
-
-def solve_sudoku(bqm, matrix):
-    """Solve BQM and return matrix with solution."""
+
+    variables = np.argwhere(get_candidates(matrix))
+    rows, cols, digits = variables.T
+    k = len(variables)
+
+    # One group id per constraint type: cell, row/digit, column/digit, sub-square/digit
+    groups = [rows * n + cols,
+              rows * n + digits,
+              cols * n + digits,
+              ((rows // m) * m + cols // m) * n + digits]
+
+    linear = np.zeros(k)
+    pairs_u, pairs_v = [], []
+    offset = 0
+    for group in groups:
+        # Members of a group are adjacent once sorted, and a group has at most n of them
+        order = np.argsort(group, kind="stable")
+        sorted_group = group[order]
+        for shift in range(1, n):
+            same = sorted_group[:-shift] == sorted_group[shift:]
+            pairs_u.append(order[:-shift][same])
+            pairs_v.append(order[shift:][same])
+        linear -= 1
+        offset += len(np.unique(group))
+    quadratic = (np.concatenate(pairs_u), np.concatenate(pairs_v),
+                 np.full(sum(len(u) for u in pairs_u), 2.0))
+
+    bqm = dimod.BinaryQuadraticModel.from_numpy_vectors(
+        linear, quadratic, offset, dimod.BINARY)
+    return bqm, variables
+
+def score_samples(sampleset, variables, matrix):
+    """Decode every read of a SampleSet and check them all in one pass.
+
+    Returns (index, feasible_mask): the record index of the lowest-energy
+    read that is a valid solution (or of the lowest-energy read if none
+    is), and a boolean array marking the valid reads.
+    """
+    n = len(matrix)
+    record = sampleset.record
+    # Columns of record.sample in candidate order
+    order = np.asarray(sampleset.variables, dtype=np.int64)
+    samples = np.zeros((len(record), len(variables)), dtype=np.int8)
+    samples[:, order] = record.sample
+
+    onehot = np.zeros((len(record), n, n, n), dtype=np.int8)
+    onehot[:] = np.asarray(matrix)[:, :, None] == np.arange(1, n + 1)
+    rows, cols, digits = np.asarray(variables).T
+    onehot[:, rows, cols, digits] = samples
+
+    mask = feasible(onehot)
+    energies = np.where(mask, record.energy, np.inf) if mask.any() else record.energy
+    return int(np.argmin(energies)), mask
+
+
+def solve_sudoku(bqm, variables, matrix, num_reads=10):
+    """Solve BQM and return the matrix with the best valid solution found,
+    along with the number of valid reads and the number of reads.
+    """
+    # Only needed here, so the builders can be used without dwave-hybrid
+    from hybrid.reference import KerberosSampler
+
     solution = KerberosSampler().sample(bqm,
+                                        num_reads=num_reads,
                                         max_iter=10,
                                         convergence=3,
                                         qpu_params={'label': 'Example - Sudoku'})
-    best_solution = solution.first.sample
+    best, mask = score_samples(solution, variables, matrix)
+    best_solution = dict(zip(solution.variables, solution.record.sample[best]))
     solution_list = [k for k, v in best_solution.items() if v == 1]
 
     result = copy.deepcopy(matrix)
 
     for label in solution_list:
-        coord, digit = label.split('_')
-        row, col = map(int, coord.split(','))
+        row, col, digit = (int(x) for x in variables[label])
+        digit += 1
 
         if result[row][col] > 0:
             # the returned solution is not optimal and either tried to
@@ -197,23 +265,38 @@ def solve_sudoku(bqm, matrix):
 
         result[row][col] = int(digit)
 
-    return result
+    return result, int(mask.sum()), len(mask)
 
 if __name__ == "__main__":
     # Read user input
     if len(sys.argv) > 1:
         filename = sys.argv[1]
     else:
-        filename = "problem.txt"
-        print("Warning: using default problem file, '{}'. Usage: python "
-              "{} <sudoku filepath>".format(filename, sys.argv[0]))
+        filename = None
+        print("No puzzle file given, generating one. Usage: python "
+              "{} <sudoku filepath or pool file>".format(sys.argv[0]))
 
     # Read sudoku problem as matrix
     matrix = get_matrix(filename)
-
-    # Solve BQM and update matrix
-    bqm = build_bqm(matrix)
-    result = solve_sudoku(bqm, matrix)
+    for line in matrix:
+        print(*line, sep=" ")
+    print()
+
+    # Fill in every forced digit; only the cells left undetermined need the annealer
+    try:
+        matrix = propagate(matrix)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+    if all(all(line) for line in matrix):
+        print("Solved by constraint propagation")
+        result = matrix
+    else:
+        # Solve BQM and update matrix
+        bqm, variables = build_bqm(matrix)
+        print("Annealing {} candidates".format(len(variables)))
+        result, valid_reads, reads = solve_sudoku(bqm, variables, matrix)
+        print("{} of {} reads were valid solutions".format(valid_reads, reads))
 
     # Print solution
     for line in result:
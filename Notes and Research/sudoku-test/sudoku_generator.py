@@ -0,0 +1,203 @@
+"""Generate 9x9 Sudoku puzzles natively, with no JavaScript runtime.
+
+    python sudoku_generator.py                          # print one medium puzzle
+    python sudoku_generator.py --difficulty hard --seed 7
+    python sudoku_generator.py --count 10000 --out puzzles.pool
+
+A puzzle starts as a random solved grid filled by backtracking. Givens are
+then removed in random order, but only while the puzzle keeps exactly one
+solution, until the difficulty's number of clues is reached. Candidates are
+kept as 9-bit masks per row, column and sub-square, and the search always
+branches on the cell with the fewest candidates.
+
+A pool file holds many puzzles, two cells per byte, so solver nodes can
+draw a puzzle without generating one.
+"""
+import argparse
+import random
+
+N = 9
+ALL_DIGITS = (1 << (N + 1)) - 2      # bits 1..9
+DIFFICULTY_CLUES = {"easy": 40, "medium": 32, "hard": 26}
+POOL_MAGIC = b"SDK1"
+RECORD_BYTES = (N * N + 1) // 2
+
+
+def _box(cell):
+    return (cell // 27) * 3 + (cell % 9) // 3
+
+
+class _Masks(object):
+    """Digits used in each row, column and sub-square of a flat 81-cell grid."""
+
+    def __init__(self, grid):
+        self.rows = [0] * N
+        self.cols = [0] * N
+        self.boxes = [0] * N
+        for cell, digit in enumerate(grid):
+            if digit:
+                self.toggle(cell, digit)
+
+    def toggle(self, cell, digit):
+        bit = 1 << digit
+        self.rows[cell // 9] ^= bit
+        self.cols[cell % 9] ^= bit
+        self.boxes[_box(cell)] ^= bit
+
+    def candidates(self, cell):
+        return ALL_DIGITS & ~(self.rows[cell // 9] | self.cols[cell % 9] | self.boxes[_box(cell)])
+
+
+def _most_constrained(grid, masks):
+    """Return (cell, candidate mask) for the empty cell with the fewest candidates."""
+    best, best_mask, best_count = None, 0, N + 1
+    for cell in range(N * N):
+        if grid[cell]:
+            continue
+        mask = masks.candidates(cell)
+        count = mask.bit_count()
+        if count < best_count:
+            best, best_mask, best_count = cell, mask, count
+            if count <= 1:
+                break
+    return best, best_mask
+
+
+def _digits(mask):
+    return [digit for digit in range(1, N + 1) if mask >> digit & 1]
+
+
+def solve(grid, rng=None):
+    """Fill a flat 81-cell grid in place; return True if it was solvable.
+
+    With rng the digits are tried in random order, which is how solved
+    grids are generated.
+    """
+    masks = _Masks(grid)
+
+    def search():
+        cell, mask = _most_constrained(grid, masks)
+        if cell is None:
+            return True
+        digits = _digits(mask)
+        if rng is not None:
+            rng.shuffle(digits)
+        for digit in digits:
+            grid[cell] = digit
+            masks.toggle(cell, digit)
+            if search():
+                return True
+            masks.toggle(cell, digit)
+        grid[cell] = 0
+        return False
+
+    return search()
+
+
+def count_solutions(grid, limit=2):
+    """Return the number of solutions of a flat grid, counting no further than limit."""
+    grid = list(grid)
+    masks = _Masks(grid)
+
+    def search():
+        cell, mask = _most_constrained(grid, masks)
+        if cell is None:
+            return 1
+        found = 0
+        for digit in _digits(mask):
+            grid[cell] = digit
+            masks.toggle(cell, digit)
+            found += search()
+            masks.toggle(cell, digit)
+            if found >= limit:
+                break
+        grid[cell] = 0
+        return found
+
+    return search()
+
+
+def generate(difficulty="medium", seed=None):
+    """Return a puzzle with a unique solution as a list of 9 rows, 0 for empty."""
+    if difficulty not in DIFFICULTY_CLUES:
+        raise ValueError("difficulty must be one of {}".format(", ".join(DIFFICULTY_CLUES)))
+    rng = random.Random(seed)
+    grid = [0] * (N * N)
+    solve(grid, rng)
+
+    clues = N * N
+    cells = list(range(N * N))
+    rng.shuffle(cells)
+    for cell in cells:
+        if clues <= DIFFICULTY_CLUES[difficulty]:
+            break
+        digit, grid[cell] = grid[cell], 0
+        if count_solutions(grid) == 1:
+            clues -= 1
+        else:
+            grid[cell] = digit
+    return [grid[row * N:(row + 1) * N] for row in range(N)]
+
+
+def pack(matrix):
+    """Pack a puzzle into RECORD_BYTES bytes, one cell per 4 bits."""
+    cells = [digit for row in matrix for digit in row] + [0]
+    return bytes(cells[i] << 4 | cells[i + 1] for i in range(0, N * N, 2))
+
+
+def unpack(record):
+    cells = []
+    for byte in record:
+        cells.extend((byte >> 4, byte & 15))
+    return [cells[row * N:(row + 1) * N] for row in range(N)]
+
+
+def write_pool(path, count, difficulty="medium", seed=None):
+    """Generate count puzzles into a pool file."""
+    rng = random.Random(seed)
+    with open(path, "wb") as f:
+        f.write(POOL_MAGIC)
+        for _ in range(count):
+            f.write(pack(generate(difficulty, rng.getrandbits(64))))
+
+
+def read_pool(path, index=None, seed=None):
+    """Return one puzzle from a pool file: number index, or a random one.
+
+    Raises IndexError if the pool has no puzzle with that index.
+    """
+    with open(path, "rb") as f:
+        if f.read(len(POOL_MAGIC)) != POOL_MAGIC:
+            raise ValueError("{} is not a Sudoku pool file".format(path))
+        f.seek(0, 2)
+        count = (f.tell() - len(POOL_MAGIC)) // RECORD_BYTES
+        if count == 0:
+            raise ValueError("{} holds no puzzles".format(path))
+        if index is None:
+            index = random.Random(seed).randrange(count)
+        elif not 0 <= index < count:
+            raise IndexError("{} holds {} puzzles; there is no puzzle {}".format(path, count, index))
+        f.seek(len(POOL_MAGIC) + index * RECORD_BYTES)
+        return unpack(f.read(RECORD_BYTES))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate Sudoku puzzles.")
+    parser.add_argument("--difficulty", choices=sorted(DIFFICULTY_CLUES), default="medium")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--count", type=int, default=1)
+    parser.add_argument("--out", help="Write the puzzles to this pool file instead of printing")
+    args = parser.parse_args(argv)
+
+    if args.out:
+        write_pool(args.out, args.count, args.difficulty, args.seed)
+        return
+    rng = random.Random(args.seed)
+    for _ in range(args.count):
+        for row in generate(args.difficulty, rng.getrandbits(64)):
+            print(*row, sep=" ")
+        print()
+
+
+if __name__ == "__main__":
+    main()
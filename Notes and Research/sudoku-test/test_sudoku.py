@@ -0,0 +1,90 @@
+import dimod
+import numpy as np
+import pytest
+
+import sudoku
+import sudoku_generator
+
+
+def puzzle_and_solution(seed, difficulty="hard"):
+    puzzle = sudoku_generator.generate(difficulty, seed=seed)
+    grid = [digit for row in puzzle for digit in row]
+    assert sudoku_generator.solve(grid)
+    return puzzle, [grid[row * 9:(row + 1) * 9] for row in range(9)]
+
+
+def encode(solution, variables):
+    """Return the sample that puts solution's digits in the candidate variables."""
+    rows, cols, digits = np.asarray(variables).T
+    return dict(enumerate((np.asarray(solution)[rows, cols] == digits + 1).astype(int)))
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_solution_has_zero_energy(seed):
+    puzzle, solution = puzzle_and_solution(seed)
+    bqm, variables = sudoku.build_bqm(puzzle)
+
+    assert bqm.energy(encode(solution, variables)) == 0
+    # Leaving every candidate empty breaks every open one-hot group
+    assert bqm.energy(dict.fromkeys(bqm.variables, 0)) > 0
+
+
+def test_propagated_solution_has_zero_energy():
+    puzzle, solution = puzzle_and_solution(7)
+    presolved = sudoku.propagate(puzzle)
+    bqm, variables = sudoku.build_bqm(presolved)
+
+    assert bqm.energy(encode(solution, variables)) == 0
+
+
+def decode(sample, variables, puzzle):
+    """Return the one-hot grid of a sample, with the givens filled in."""
+    onehot = np.asarray(puzzle)[:, :, None] == np.arange(1, 10)
+    for label, value in sample.items():
+        if value:
+            row, col, digit = variables[label]
+            onehot[row, col, digit] = True
+    return onehot
+
+
+def test_score_samples_agrees_with_feasible():
+    puzzle, solution = puzzle_and_solution(3)
+    bqm, variables = sudoku.build_bqm(puzzle)
+    rng = np.random.default_rng(0)
+    good = encode(solution, variables)
+
+    samples = [good]
+    for _ in range(30):
+        # Flip a few candidates of the solution, or draw a random assignment
+        sample = dict(good)
+        for label in rng.choice(len(variables), size=rng.integers(1, 4), replace=False):
+            sample[int(label)] ^= 1
+        samples.append(sample if rng.random() < 0.7 else
+                       {label: int(rng.random() < 0.2) for label in good})
+    samples.append(good)
+    # A shuffled variable order checks that reads are decoded by label
+    labels = list(rng.permutation(len(variables)))
+    sampleset = dimod.SampleSet.from_samples_bqm(
+        ([[sample[label] for label in labels] for sample in samples], labels), bqm)
+
+    index, mask = sudoku.score_samples(sampleset, variables, puzzle)
+
+    expected = [bool(sudoku.feasible(decode(dict(zip(sampleset.variables, row)), variables, puzzle)))
+                for row in sampleset.record.sample]
+    assert mask.tolist() == expected
+    # Only the two copies of the solution are valid; every changed read breaks a group
+    assert mask.sum() == 2
+    assert mask[index]
+    assert sampleset.record.energy[index] == sampleset.record.energy[mask].min()
+
+
+def test_score_samples_without_a_valid_read_picks_the_lowest_energy():
+    puzzle, _ = puzzle_and_solution(4)
+    bqm, variables = sudoku.build_bqm(puzzle)
+    sampleset = dimod.SampleSet.from_samples_bqm(
+        [dict.fromkeys(bqm.variables, 0), dict.fromkeys(bqm.variables, 1)], bqm)
+
+    index, mask = sudoku.score_samples(sampleset, variables, puzzle)
+
+    assert not mask.any()
+    assert index == int(np.argmin(sampleset.record.energy))
@@ -0,0 +1,296 @@
+"""Benchmark the compile and solve pipeline in-process and catch regressions.
+
+    python benchmark.py                          # every workload, compared with the baseline
+    python benchmark.py array sudoku --repeat 10 # workloads whose name starts with these
+    python benchmark.py --save-baseline          # record the current numbers as the baseline
+    python benchmark.py --list
+
+Requests go through each app's Flask test client, so the numbers cover
+parsing, compiling, solving and serializing but not the network. Both
+apps are warmed up first and every workload runs once untimed. Caches are
+emptied before each timed run: TESTserver's compiled-model caches are
+cleared, and server.py requests get a fresh seed, which changes the
+solution-cache key.
+
+For each workload the report gives the median wall time, the median of
+every Server-Timing stage, and the peak Python memory (tracemalloc) of
+one extra run. Against a baseline, a workload regresses when its time or
+peak memory grows by more than --threshold and by at least 1 ms or
+1 MiB; any regression makes the exit status 1. Timings only compare
+within one machine, so against a baseline recorded on a different
+environment (Python, platform or CPU count) regressions are reported but
+do not change the exit status; record a baseline on the machine that
+runs the checks.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+import serve
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SUDOKU_DIR = os.path.join(HERE, "..", "..", "Notes and Research", "sudoku-test")
+BASELINE_PATH = os.path.join(HERE, "benchmark_baseline.json")
+# Changes smaller than these are noise, whatever the ratio
+MIN_DELTA_MS = 1.0
+MIN_DELTA_MIB = 1.0
+
+ARRAY_SIZES = (10, 100, 500, 2000)
+# One constraint over all n variables expands to n * n / 2 couplers
+DENSE_ARRAY_SIZES = (10, 100, 500)
+BOARD = ["X", "", "", "", "O", "", "", "", "X"]
+
+
+class Workload:
+    """One generated request (or local step) to time.
+
+    run(i) performs the i-th run and returns (response or None, local
+    stage timings in seconds).
+    """
+
+    def __init__(self, name, run):
+        self.name = name
+        self.run = run
+
+
+def tictactoe_model():
+    weights = (7, 5, 7, 5, 9, 5, 7, 5, 7)
+    cells = [f"x{i}" for i in range(9)]
+    return {
+        "variables": {cell: {"type": "Binary"} for cell in cells},
+        "Constraints": [{"lhs": " + ".join(cells), "comparison": "=", "rhs": 1}],
+        "Objective": " + ".join(f"-{w} * {cell}" for w, cell in zip(weights, cells)),
+    }
+
+
+def array_model(size, dense):
+    """An Array model with one constraint over everything, or a chain of pairwise ones."""
+    x = [f"x[{i}]" for i in range(size)]
+    if dense:
+        constraints = [{"lhs": " + ".join(x), "comparison": "=", "rhs": max(1, size // 10)}]
+    else:
+        constraints = [{"lhs": f"{x[i]} + {x[i + 1]}", "comparison": "<=", "rhs": 1}
+                       for i in range(size - 1)]
+    return {
+        "variables": {"x": {"type": "Array", "size": size}},
+        "Constraints": constraints,
+        "Objective": " + ".join(f"{(i * 7) % 11 - 5} * {x[i]}" for i in range(size)),
+    }
+
+
+def onehot_problem(size, seed):
+    """server.py's linear/quadratic form of a pick-one-of-size model."""
+    return {
+        "linear": {str(i): -1.0 - (i % 3) for i in range(size)},
+        "quadratic": {f"{i},{j}": 2.0 for i in range(size) for j in range(i + 1, size)},
+        "num_reads": 10,
+        "seed": seed,
+    }
+
+
+def sudoku_modules():
+    if SUDOKU_DIR not in sys.path:
+        sys.path.insert(0, SUDOKU_DIR)
+    import sudoku
+    import sudoku_generator
+    return sudoku, sudoku_generator
+
+
+def make_workloads():
+    testserver = serve.load_app("testserver")
+    server = serve.load_app("server")
+    tests_module = sys.modules["TESTserver"]
+    test_client = testserver.test_client()
+    client = server.test_client()
+
+    def compile_request(path, payload):
+        def run(i):
+            tests_module.model_cache.clear()
+            tests_module.template_cache.clear()
+            return test_client.post(path, json=payload), {}
+        return run
+
+    def solve_request(make_problem):
+        return lambda i: (client.post("/quantum", json=make_problem(i)), {})
+
+    workloads = [
+        Workload("tictactoe-compile", compile_request("/quantum", tictactoe_model())),
+        Workload("tictactoe-solve", compile_request("/quantum/solve", dict(tictactoe_model(), board=BOARD))),
+        Workload("tictactoe-fallback", compile_request("/quantum", {"variables": {}, "board": BOARD})),
+        Workload("server-onehot-9", solve_request(lambda i: onehot_problem(9, i))),
+        Workload("server-onehot-64", solve_request(lambda i: onehot_problem(64, i))),
+    ]
+    workloads += [Workload(f"array-sparse-{n}", compile_request("/quantum", array_model(n, dense=False)))
+                  for n in ARRAY_SIZES]
+    workloads += [Workload(f"array-dense-{n}", compile_request("/quantum", array_model(n, dense=True)))
+                  for n in DENSE_ARRAY_SIZES]
+
+    sudoku, sudoku_generator = sudoku_modules()
+    puzzle = sudoku_generator.generate("hard", seed=1)
+
+    def sudoku_build(i):
+        start = time.perf_counter()
+        presolved = sudoku.propagate(puzzle)
+        middle = time.perf_counter()
+        sudoku.build_bqm(presolved)
+        return None, {"propagate": middle - start, "build_bqm": time.perf_counter() - middle}
+
+    bqm, _ = sudoku.build_bqm(puzzle)
+    sudoku_problem = {
+        "linear": {str(v): bias for v, bias in bqm.linear.items()},
+        "quadratic": {f"{u},{v}": bias for (u, v), bias in bqm.quadratic.items()},
+        "num_reads": 10,
+    }
+    workloads += [
+        Workload("sudoku-build", sudoku_build),
+        Workload(f"sudoku-solve-{len(bqm.variables)}",
+                 solve_request(lambda i: dict(sudoku_problem, seed=i))),
+    ]
+    return workloads
+
+
+def server_timing(response):
+    """Return {stage: seconds} from a Server-Timing header."""
+    stages = {}
+    for entry in response.headers.get("Server-Timing", "").split(","):
+        name, _, duration = entry.strip().partition(";dur=")
+        if name and duration and name != "total":
+            stages[name] = float(duration) / 1000
+    return stages
+
+
+def measure(workload, repeat):
+    """Return the medians, peak memory and fallback flag of one workload."""
+    workload.run(-1)
+
+    totals, stages, fallback = [], {}, False
+    for i in range(repeat):
+        start = time.perf_counter()
+        response, local = workload.run(i)
+        totals.append(time.perf_counter() - start)
+        timings = dict(local)
+        if response is not None:
+            if response.status_code != 200:
+                raise RuntimeError(f"{workload.name}: HTTP {response.status_code}: {response.get_data(as_text=True)}")
+            timings.update(server_timing(response))
+            body = response.get_json(silent=True) or {}
+            fallback = fallback or bool(body.get("explanation", {}).get("using_fallback"))
+        for name, seconds in timings.items():
+            stages.setdefault(name, []).append(seconds)
+
+    tracemalloc.start()
+    try:
+        workload.run(repeat)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "total_ms": round(statistics.median(totals) * 1000, 3),
+        "stages_ms": {name: round(statistics.median(values) * 1000, 3) for name, values in stages.items()},
+        "peak_mib": round(peak / (1 << 20), 3),
+        "fallback": fallback,
+    }
+
+
+def environment():
+    return {"python": platform.python_version(), "platform": platform.platform(),
+            "machine": platform.machine(), "cpus": os.cpu_count()}
+
+
+def compare(results, baseline, threshold):
+    """Return {workload: [regression messages]} for results that got worse."""
+    regressions = {}
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        messages = []
+        if (current["total_ms"] > previous["total_ms"] * threshold
+                and current["total_ms"] - previous["total_ms"] >= MIN_DELTA_MS):
+            messages.append(f"time {previous['total_ms']:.1f} -> {current['total_ms']:.1f} ms")
+        if (current["peak_mib"] > previous["peak_mib"] * threshold
+                and current["peak_mib"] - previous["peak_mib"] >= MIN_DELTA_MIB):
+            messages.append(f"peak {previous['peak_mib']:.1f} -> {current['peak_mib']:.1f} MiB")
+        if current["fallback"] and not previous["fallback"]:
+            messages.append("now answered by the fallback")
+        if messages:
+            regressions[name] = messages
+    return regressions
+
+
+def print_report(results, baseline):
+    for name, result in results.items():
+        previous = baseline.get(name)
+        change = f"{result['total_ms'] / previous['total_ms']:6.2f}x" if previous else "   new"
+        flag = "  FALLBACK" if result["fallback"] else ""
+        print(f"{name:<22} {result['total_ms']:9.2f} ms {change}  peak {result['peak_mib']:7.2f} MiB{flag}")
+        for stage, ms in result["stages_ms"].items():
+            print(f"    {stage:<18} {ms:9.2f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("workloads", nargs="*", help="Only run workloads whose name starts with one of these")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="Write the results to --baseline instead of comparing")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="Ratio over the baseline that counts as a regression")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    parser.add_argument("--list", action="store_true", help="List the workloads and exit")
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    import health
+
+    workloads = make_workloads()
+    if args.workloads:
+        workloads = [w for w in workloads if w.name.startswith(tuple(args.workloads))]
+        if not workloads:
+            parser.error("no workload matches: " + ", ".join(args.workloads))
+    if args.list:
+        print("\n".join(w.name for w in workloads))
+        return
+
+    health.warm_up(serve.load_app("server"))
+    health.warm_up(serve.load_app("testserver"))
+    results = {w.name: measure(w, args.repeat) for w in workloads}
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({"environment": environment(), "repeat": args.repeat, "results": results},
+                      f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+        return
+
+    baseline, comparable = {}, True
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            stored = json.load(f)
+        baseline = stored["results"]
+        if stored.get("environment") != environment():
+            comparable = False
+            print(f"Note: the baseline was recorded on {stored.get('environment')}; "
+                  "regressions will not fail this run", file=sys.stderr)
+    regressions = compare(results, baseline, args.threshold)
+
+    if args.json:
+        print(json.dumps({"results": results, "regressions": regressions}, indent=2))
+    else:
+        print_report(results, baseline)
+        for name, messages in regressions.items():
+            print(f"REGRESSION {name}: {'; '.join(messages)}")
+    if regressions and comparable:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
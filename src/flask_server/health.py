@@ -0,0 +1,72 @@
+import logging
+import threading
+import time
+
+from flask import jsonify
+
+from structured_logging import get_logger, log
+
+logger = get_logger("health")
+
+_ready = threading.Event()
+_draining = threading.Event()
+
+
+def init_app(app, warm_up=None, shutdown=None):
+    """Add /healthz and /ready, and register the app's warm-up and shutdown hooks.
+
+    /healthz answers as soon as the process serves requests. /ready answers
+    503 until warm_up() has run and again once the process starts draining,
+    so a load balancer only routes to warmed, live workers.
+    """
+    app.extensions["health"] = {"warm_up": warm_up, "shutdown": shutdown}
+
+    @app.route("/healthz", methods=["GET"])
+    def healthz():
+        return jsonify({"status": "ok"}), 200
+
+    @app.route("/ready", methods=["GET"])
+    def ready():
+        if _draining.is_set():
+            return jsonify({"status": "draining"}), 503
+        if not _ready.is_set():
+            return jsonify({"status": "warming_up"}), 503
+        return jsonify({"status": "ready"}), 200
+
+
+def warm_up(app):
+    """Run the app's warm-up hook once, then report ready."""
+    hook = app.extensions.get("health", {}).get("warm_up")
+    start = time.perf_counter()
+    if hook is not None:
+        try:
+            hook()
+        except Exception as e:
+            # A failed warm-up only costs the first request its speed
+            log(logger, logging.ERROR, "warm-up failed", exc_info=True, error=str(e))
+    log(logger, logging.INFO, "warm-up finished",
+        duration_ms=round((time.perf_counter() - start) * 1000, 3))
+    _ready.set()
+
+
+def warm_up_in_background(app):
+    """Run warm_up(app) on a daemon thread so the process can serve right away.
+
+    Requests that need the solvers before it finishes import them on first use.
+    """
+    thread = threading.Thread(target=warm_up, args=(app,), name="warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def drain():
+    """Stop reporting ready; in-flight requests still finish."""
+    _draining.set()
+
+
+def shutdown(app):
+    """Drain, then run the app's shutdown hook to stop background work."""
+    drain()
+    hook = app.extensions.get("health", {}).get("shutdown")
+    if hook is not None:
+        hook()
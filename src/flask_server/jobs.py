@@ -0,0 +1,214 @@
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from solvers import problem_to_bqm, selected_index, solve_bqm, solver_params
+
+# Long solves run here so request threads stay free for quick /quantum calls
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 2))
+MAX_PENDING_JOBS = int(os.environ.get("MAX_PENDING_JOBS", 64))
+# Finished jobs are kept this long so clients can still fetch the result
+JOB_RETENTION = float(os.environ.get("JOB_RETENTION", 600))
+# Seconds between keep-alive comments on an idle event stream
+EVENT_KEEPALIVE = 15.0
+
+FINISHED = ("done", "failed", "cancelled")
+
+
+class QueueFull(Exception):
+    """Raised when MAX_PENDING_JOBS jobs are already queued or running."""
+
+
+class Job:
+    """A submitted solve and the best sample found so far."""
+
+    def __init__(self, bqm, params):
+        self.id = uuid.uuid4().hex
+        self.bqm = bqm
+        self.params = params
+        self.status = "queued"
+        self.num_reads = params["num_reads"]
+        self.reads_done = 0
+        self.solver = None
+        self.best_sample = None
+        self.best_energy = None
+        self.timed_out = False
+        self.error = None
+        self.cancel_requested = False
+        self.finished_at = None
+        # Bumped on every change; event streams wait for it to move
+        self.version = 0
+        self.changed = threading.Condition()
+
+    def update(self, **fields):
+        with self.changed:
+            for name, value in fields.items():
+                setattr(self, name, value)
+            if fields.get("status") in FINISHED:
+                self.finished_at = time.monotonic()
+            self.version += 1
+            self.changed.notify_all()
+
+    def snapshot(self):
+        """Return the job state as a JSON-serializable dict."""
+        with self.changed:
+            return {
+                "job_id": self.id,
+                "status": self.status,
+                "num_reads": self.num_reads,
+                "reads_done": self.reads_done,
+                "progress": self.reads_done / self.num_reads if self.num_reads else 1.0,
+                "solver": self.solver,
+                "solution": selected_index(self.best_sample) if self.best_sample else None,
+                "sample": self.best_sample,
+                "energy": self.best_energy,
+                "timed_out": self.timed_out,
+                "error": self.error,
+            }
+
+    def events(self):
+        """Yield Server-Sent Events until the job finishes.
+
+        A "progress" event carries the snapshot after each change, and the
+        final snapshot is sent as a "done", "failed" or "cancelled" event.
+        """
+        seen = -1
+        while True:
+            # Never yield while holding the lock: a slow client would stall
+            # the suspended generator and with it every update to the job
+            with self.changed:
+                if self.version == seen:
+                    self.changed.wait(EVENT_KEEPALIVE)
+                idle = self.version == seen
+                seen = self.version
+                status = self.status
+            if idle:
+                yield ": keep-alive\n\n"
+                continue
+            event = status if status in FINISHED else "progress"
+            yield f"event: {event}\ndata: {json.dumps(self.snapshot())}\n\n"
+            if status in FINISHED:
+                return
+
+
+def run_job(job):
+    """Solve one read at a time, publishing the best sample after each read."""
+    if job.cancel_requested:
+        return
+    job.update(status="running")
+
+    params = dict(job.params)
+    num_reads = params.pop("num_reads")
+    time_limit = params.pop("time_limit", None)
+    solver = params.pop("solver", None)
+    seed = params.pop("seed", None)
+    deadline = time.monotonic() + time_limit if time_limit else None
+
+    try:
+        for read in range(num_reads):
+            if job.cancel_requested:
+                job.update(status="cancelled")
+                return
+            if deadline is not None and time.monotonic() >= deadline:
+                job.update(timed_out=True)
+                break
+            if seed is not None:
+                params["seed"] = (seed + read) % (1 << 32)
+
+            read_limit = None
+            if deadline is not None:
+                read_limit = max(1e-3, (deadline - time.monotonic()) / (num_reads - read))
+            sampleset = solve_bqm(job.bqm, solver=solver, num_reads=1,
+                                  time_limit=read_limit, **params)
+            solver = sampleset.info["solver"]
+
+            best = sampleset.first
+            improved = job.best_energy is None or best.energy < job.best_energy
+            if solver == "exact":
+                # Enumeration already found the ground state; more reads would repeat it
+                job.update(solver=solver, reads_done=num_reads,
+                           best_sample={str(k): int(v) for k, v in best.sample.items()},
+                           best_energy=float(best.energy))
+                break
+            if improved:
+                job.update(solver=solver, reads_done=read + 1,
+                           best_sample={str(k): int(v) for k, v in best.sample.items()},
+                           best_energy=float(best.energy))
+            else:
+                job.update(solver=solver, reads_done=read + 1)
+    except Exception as e:
+        job.update(status="failed", error=str(e))
+        return
+
+    job.bqm = None
+    job.update(status="done")
+
+
+class JobQueue:
+    """Runs solve jobs on a bounded thread pool and keeps their state."""
+
+    def __init__(self, max_workers=JOB_WORKERS, max_pending=MAX_PENDING_JOBS,
+                 retention=JOB_RETENTION):
+        self.max_pending = max_pending
+        self.retention = retention
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix="solve-job")
+
+    def submit(self, problem):
+        """Validate problem, queue it and return the Job.
+
+        Raises ValueError for malformed problems and QueueFull when too many
+        jobs are already pending.
+        """
+        try:
+            params = solver_params(problem)
+            bqm = problem_to_bqm(problem)
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Invalid problem: {e}") from None
+
+        job = Job(bqm, params)
+        with self._lock:
+            self._expire()
+            pending = sum(1 for j in self._jobs.values() if j.status not in FINISHED)
+            if pending >= self.max_pending:
+                raise QueueFull(f"At most {self.max_pending} jobs can be pending")
+            self._jobs[job.id] = job
+        self._executor.submit(run_job, job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            self._expire()
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Ask a job to stop after its current read; return the Job or None."""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        job.cancel_requested = True
+        if job.status == "queued":
+            job.update(status="cancelled")
+        return job
+
+    def shutdown(self):
+        """Cancel queued jobs, stop running ones after their current read and wait."""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            if job.status not in FINISHED:
+                self.cancel(job.id)
+        self._executor.shutdown(wait=True)
+
+    def _expire(self):
+        now = time.monotonic()
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished_at is not None and now - job.finished_at > self.retention]
+        for job_id in expired:
+            del self._jobs[job_id]
@@ -0,0 +1,124 @@
+"""Minimal RFC 6902 JSON Patch (with RFC 6901 JSON Pointer) for workspace deltas."""
+import copy
+
+
+class JsonPatchError(ValueError):
+    """Raised for malformed patches and operations that do not apply."""
+
+
+def _tokens(pointer):
+    if not isinstance(pointer, str):
+        raise JsonPatchError(f"Pointer must be a string, got {type(pointer).__name__}")
+    if pointer == "":
+        return []
+    if not pointer.startswith("/"):
+        raise JsonPatchError(f"Pointer must start with '/': {pointer!r}")
+    return [token.replace("~1", "/").replace("~0", "~") for token in pointer[1:].split("/")]
+
+
+def _index(container, token, allow_end=False):
+    if allow_end and token == "-":
+        return len(container)
+    if not token.isdigit() or (token != "0" and token.startswith("0")):
+        raise JsonPatchError(f"Invalid array index: {token!r}")
+    index = int(token)
+    if index > len(container) or (index == len(container) and not allow_end):
+        raise JsonPatchError(f"Array index out of range: {index}")
+    return index
+
+
+def _get(doc, tokens):
+    for token in tokens:
+        if isinstance(doc, list):
+            doc = doc[_index(doc, token)]
+        elif isinstance(doc, dict):
+            if token not in doc:
+                raise JsonPatchError(f"Path not found: /{'/'.join(tokens)}")
+            doc = doc[token]
+        else:
+            raise JsonPatchError(f"Path not found: /{'/'.join(tokens)}")
+    return doc
+
+
+def _add(doc, tokens, value):
+    if not tokens:
+        return value
+    parent = _get(doc, tokens[:-1])
+    if isinstance(parent, list):
+        parent.insert(_index(parent, tokens[-1], allow_end=True), value)
+    elif isinstance(parent, dict):
+        parent[tokens[-1]] = value
+    else:
+        raise JsonPatchError(f"Cannot add to a {type(parent).__name__}")
+    return doc
+
+
+def _remove(doc, tokens):
+    if not tokens:
+        raise JsonPatchError("Cannot remove the whole document")
+    parent = _get(doc, tokens[:-1])
+    if isinstance(parent, list):
+        return parent.pop(_index(parent, tokens[-1]))
+    if isinstance(parent, dict) and tokens[-1] in parent:
+        return parent.pop(tokens[-1])
+    raise JsonPatchError(f"Path not found: /{'/'.join(tokens)}")
+
+
+def _json_equal(a, b):
+    # JSON types must match too: true is not 1 and 1 is not "1"
+    if isinstance(a, bool) or isinstance(b, bool):
+        return type(a) is type(b) and a == b
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+        return a == b
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(_json_equal(a[k], b[k]) for k in a)
+    if isinstance(a, list):
+        return len(a) == len(b) and all(_json_equal(x, y) for x, y in zip(a, b))
+    return a == b
+
+
+def apply_patch(document, patch, in_place=False):
+    """Apply a JSON Patch (a list of operations) and return the new document.
+
+    The document is deep-copied first unless in_place is set. Any failing
+    operation raises JsonPatchError, so a patch either applies fully or the
+    caller keeps the original.
+    """
+    if not isinstance(patch, list):
+        raise JsonPatchError("A JSON Patch must be a list of operations")
+    doc = document if in_place else copy.deepcopy(document)
+
+    for operation in patch:
+        if not isinstance(operation, dict) or "op" not in operation or "path" not in operation:
+            raise JsonPatchError(f"Invalid operation: {operation!r}")
+        op = operation["op"]
+        tokens = _tokens(operation["path"])
+
+        if op in ("add", "replace", "test") and "value" not in operation:
+            raise JsonPatchError(f"'{op}' needs a 'value'")
+        if op in ("move", "copy") and "from" not in operation:
+            raise JsonPatchError(f"'{op}' needs a 'from'")
+
+        if op == "add":
+            doc = _add(doc, tokens, copy.deepcopy(operation["value"]))
+        elif op == "remove":
+            _remove(doc, tokens)
+        elif op == "replace":
+            if tokens:
+                _remove(doc, tokens)
+            doc = _add(doc, tokens, copy.deepcopy(operation["value"]))
+        elif op == "move":
+            source = _tokens(operation["from"])
+            if tokens[:len(source)] == source and len(tokens) > len(source):
+                raise JsonPatchError("Cannot move a value into one of its children")
+            doc = _add(doc, tokens, _remove(doc, source))
+        elif op == "copy":
+            doc = _add(doc, tokens, copy.deepcopy(_get(doc, _tokens(operation["from"]))))
+        elif op == "test":
+            if not _json_equal(_get(doc, tokens), operation["value"]):
+                raise JsonPatchError(f"Test failed at {operation['path']}")
+        else:
+            raise JsonPatchError(f"Unknown operation: {op!r}")
+    return doc
@@ -0,0 +1,158 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, g, has_request_context, request
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 4, 16, 64, 256, 1024, 4096, 16384, 65536, 262144)
+
+_registry = []
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            lines.extend(self._samples())
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+                for key, value in self._values.items()]
+
+
+class Gauge(_Metric):
+    """A gauge whose values are read from collect() at scrape time.
+
+    collect returns (labels dict, value) pairs.
+    """
+    kind = "gauge"
+
+    def __init__(self, name, documentation, collect, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.collect = collect
+
+    def _samples(self):
+        return [f"{self.name}{_format_labels(self.labelnames, self._key(labels))} {value}"
+                for labels, value in self.collect()]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, buckets, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def _samples(self):
+        lines = []
+        for key, (counts, total, count) in self._values.items():
+            for bound, bucket_count in zip(self.buckets, counts):
+                labels = _format_labels(self.labelnames, key, [("le", bound)])
+                lines.append(f"{self.name}_bucket{labels} {bucket_count}")
+            labels = _format_labels(self.labelnames, key, [("le", "+Inf")])
+            lines.append(f"{self.name}_bucket{labels} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "Time spent handling a request.",
+                            LATENCY_BUCKETS, ("method", "endpoint", "status"))
+STAGE_SECONDS = Histogram("qubo_stage_duration_seconds", "Time spent in each request stage.",
+                          LATENCY_BUCKETS, ("stage",))
+MODEL_VARIABLES = Histogram("qubo_model_variables", "Variables per model.", SIZE_BUCKETS)
+MODEL_TERMS = Histogram("qubo_model_terms", "Linear plus quadratic terms per model.", SIZE_BUCKETS)
+
+
+def render():
+    """Return every registered metric in the Prometheus text format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+@contextmanager
+def stage(name):
+    """Time a block, record it in STAGE_SECONDS and in the Server-Timing header."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        if has_request_context():
+            timings = g.setdefault("server_timing", {})
+            timings[name] = timings.get(name, 0.0) + elapsed
+
+
+def init_app(app):
+    """Time every request, add Server-Timing headers and serve /metrics."""
+
+    @app.before_request
+    def start_timer():
+        g.request_start = time.perf_counter()
+        g.server_timing = {}
+
+    @app.after_request
+    def record_request(response):
+        start = g.get("request_start")
+        if start is None:
+            return response
+        total = time.perf_counter() - start
+        REQUEST_SECONDS.observe(total, method=request.method,
+                                endpoint=request.endpoint or "unknown", status=response.status_code)
+        timings = [f"{name};dur={seconds * 1000:.3f}" for name, seconds in g.server_timing.items()]
+        timings.append(f"total;dur={total * 1000:.3f}")
+        response.headers["Server-Timing"] = ", ".join(timings)
+        # Lets the cross-origin frontend read the timings in the browser
+        response.headers["Timing-Allow-Origin"] = "*"
+        return response
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        return Response(render(), content_type="text/plain; version=0.0.4; charset=utf-8")
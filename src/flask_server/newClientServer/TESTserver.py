@@ -1,20 +1,83 @@
+import hashlib
+import json
+import logging
 import os
-import traceback
+import re
+import sys
+from functools import lru_cache
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-from pyqubo import Binary, Spin
 
-import json
+from model_cache import CompiledModelCache, canonical_model_key
+from model_templates import ModelTemplate
+from expression_compiler import ExpressionCompiler, ExpressionError
+from sparse_qubo import build_sparse_qubo, is_sparse_compatible
+import tictactoe
+
+# The solver code is shared with server.py one directory up
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from solvers import solve_qubo, solver_params
+from wire_format import JSON, encode_qubo, read_body, respond, response_format
+import health
+import metrics
+import structured_logging
+from metrics import MODEL_TERMS, MODEL_VARIABLES, Counter, Gauge, stage
+from structured_logging import get_logger, log, should_log_payload
 
 app = Flask(__name__)
 CORS(app)
+metrics.init_app(app)
+logger = get_logger("testserver")
+structured_logging.init_app(app, logger)
+
+# Compiled QUBOs keyed on a canonical hash of variables/Constraints/Objective
+model_cache = CompiledModelCache(
+    max_size=int(os.environ.get("QUBO_CACHE_SIZE", 256)),
+    ttl=float(os.environ.get("QUBO_CACHE_TTL", 3600)),
+)
+
+# Compiled pyqubo models with Placeholder coefficients, keyed on model structure.
+# Only Spin and higher-order models use pyqubo; quadratic Binary models skip it.
+template_cache = CompiledModelCache(
+    max_size=int(os.environ.get("QUBO_TEMPLATE_CACHE_SIZE", 64)),
+    ttl=float(os.environ.get("QUBO_CACHE_TTL", 3600)),
+)
+
+MODELS = Counter("qubo_models_total", "Models compiled, by compiled-model cache result.", ("cache",))
+FALLBACKS = Counter("qubo_fallbacks_total", "Requests answered with the fallback QUBO.", ("fallback_reason",))
+CACHE_STATS = Gauge("qubo_cache", "Compiled-model cache counters (size, hits, misses, hit_rate).",
+                    lambda: [({"stat": k}, v) for k, v in model_cache.stats().items()], ("stat",))
+
+# Fallback explanations carry free-form error text; metrics need a small fixed set of reasons
+FALLBACK_REASONS = (
+    ("No valid QUBO data", "no_data"),
+    ("Missing or empty 'variables'", "missing_variables"),
+    ("Invalid variable definition", "invalid_variable"),
+    ("Unsupported variable type", "unsupported_variable_type"),
+    ("Failed to parse variables", "parse_variables"),
+    ("Failed to parse constraints", "parse_constraints"),
+    ("Failed to parse objective", "parse_objective"),
+    ("QUBO compilation error", "compile_error"),
+    ("Solver error", "solver_error"),
+    ("Variables do not name board cells", "unmapped_cells"),
+)
+
+# Board cell labels: x4 / cell4, or element 4 of an array like x[4]
+CELL_LABEL = re.compile(r"^[A-Za-z_]\w*?(\d+)$|^[A-Za-z_]\w*\[(\d+)\]$")
+# Row and column of a cell, as in q_11 for the center
+ROW_COL_LABEL = re.compile(r"^[A-Za-z]\w*?_([0-2])([0-2])$")
+
+# Reads per compile-and-solve request; the move comes from the best read on a free cell
+SOLVE_NUM_READS = 10
 
 def parse_variables(variable_data):
     """Parse variables from JSON and create PyQUBO variables."""
+    # pyqubo is only needed for models the sparse builder cannot handle
+    from pyqubo import Binary, Spin
+
     variables = {}
 
-    # Add robust logging
-    print("Parsing variables:", variable_data)
+    log(logger, logging.DEBUG, "parsing variables", variable_count=len(variable_data))
 
     for var_name, var_info in variable_data.items():
         try:
@@ -26,20 +89,25 @@ def parse_variables(variable_data):
                 size = var_info.get("size", 10)
                 variables[var_name] = [Binary(f"{var_name}[{i}]") for i in range(size)]
             else:
-                print(f"Unsupported variable type: {var_info['type']}")
+                log(logger, logging.WARNING, "unsupported variable type", variable=var_name,
+                    type=var_info['type'])
                 return None
         except Exception as e:
-            print(f"Error parsing variable {var_name}: {e}")
+            log(logger, logging.WARNING, "error parsing variable", variable=var_name, error=str(e))
             return None
     
     return variables
 
-def parse_constraints(constraint_data, variables):
-    """Parse constraints from JSON and convert them to PyQUBO format."""
+def parse_constraints(constraint_data, compiler):
+    """Parse constraints from JSON into (lhs - rhs, penalty weight) pairs.
+
+    The penalty for each constraint is weight * (lhs - rhs) ** 2; squaring is
+    left to the QUBO builder so linear constraints can be expanded directly.
+    """
     constraints = []
     
-    # Add robust logging
-    print("Parsing constraints:", constraint_data)
+    log(logger, logging.DEBUG, "parsing constraints",
+        constraint_count=len(constraint_data) if constraint_data else 0)
 
     if not constraint_data:
         return constraints
@@ -50,84 +118,110 @@ def parse_constraints(constraint_data, variables):
             comparison = constraint.get("comparison", "=")
             rhs = constraint.get("rhs", 0)
             
-            # Use safer evaluation
-            lhs = eval(lhs_expr, {"__builtins__": None}, variables)
+            # Compile to coefficient dicts; only arithmetic on declared variables is allowed
+            difference = compiler.add(compiler.compile(lhs_expr), compiler.compile(rhs), -1.0)
 
             if comparison == "=":
-                constraints.append((lhs - rhs) ** 2)  # Enforce equality
+                constraints.append((difference, 1.0))  # Enforce equality
             elif comparison == "<=":
-                constraints.append((lhs - rhs) * (lhs - rhs))  # Penalize if lhs > rhs
+                constraints.append((difference, 1.0))  # Penalize if lhs > rhs
             elif comparison == ">=":
-                constraints.append((rhs - lhs) * (rhs - lhs))  # Penalize if lhs < rhs
+                constraints.append((difference, 1.0))  # Penalize if lhs < rhs
             elif comparison == "!=":
-                constraints.append((lhs - rhs) ** 2 * 100)  # Large penalty to enforce inequality
+                constraints.append((difference, 100.0))  # Large penalty to enforce inequality
         except Exception as e:
-            print(f"Error parsing constraint: {constraint}, Error: {e}")
+            log(logger, logging.WARNING, "error parsing constraint", error=str(e),
+                **payload_fields("constraint", constraint))
             return None
 
     return constraints
 
-def parse_objective(objective_expr, variables):
-    """Parse objective function from JSON."""
-    print("Parsing objective:", objective_expr)
-    
+def payload_fields(name, value):
+    """Return log fields identifying part of a request by size and hash.
+
+    The value itself is only included when should_log_payload samples it,
+    so user-written expressions stay out of routine WARNING logs.
+    """
+    text = json.dumps(value, sort_keys=True, default=str)
+    fields = {
+        f"{name}_bytes": len(text),
+        f"{name}_sha256": hashlib.sha256(text.encode("utf-8")).hexdigest()[:16],
+    }
+    if should_log_payload(logger):
+        fields[name] = value
+    return fields
+
+def parse_objective(objective_expr, compiler):
+    """Parse objective function from JSON into a polynomial."""
+    log(logger, logging.DEBUG, "parsing objective", length=len(str(objective_expr)))
+
     try:
-        # Use safer evaluation
         if objective_expr == "0" or objective_expr == "":
-            print("Warning: Objective is just 0, creating a dummy objective")
-            # Create a dummy objective with all variables to avoid compilation error
-            obj = 0
-            for var_name, var in variables.items():
-                obj += 0 * var  # Add 0 * var to avoid affecting the result
-            return obj
+            log(logger, logging.DEBUG, "objective is just 0")
+            return {}
             
-        return eval(objective_expr, {"__builtins__": None}, variables)
+        return compiler.compile(objective_expr)
     except Exception as e:
-        print(f"Error parsing objective: {objective_expr}, Error: {e}")
+        log(logger, logging.WARNING, "error parsing objective", error=str(e),
+            **payload_fields("objective", objective_expr))
         return None
 
-def create_fallback_qubo(board_size=9):
-    """Create a fallback QUBO with positive values if normal processing fails."""
-    print("Creating fallback QUBO with positive values")
+# Fallback weight of a free cell: center 9, corners 7, edges 5, moved up for a
+# forced win and down for a forced loss so minimax order always comes first
+FALLBACK_POSITION_WEIGHTS = (7, 5, 7, 5, 9, 5, 7, 5, 7)
+FALLBACK_OUTCOME_WEIGHTS = {1: 8, 0: 0, -1: -4}
+
+@lru_cache(maxsize=None)
+def fallback_payload(cells):
+    """Return (qubo, JSON-keyed qubo) for a parsed board, built once per position.
+
+    cells is a tuple from tictactoe.parse_board or None for no/unreadable
+    board. Both dicts are shared between requests and must not be modified.
+    """
+    outcomes = tictactoe.move_values(cells) if cells else None
+    if outcomes is None:
+        # No board, or a finished/impossible one: rank the free cells by position only
+        outcomes = {cell: 0 for cell in range(9) if not cells or cells[cell] == tictactoe.EMPTY}
+    free = sorted(outcomes)
+
     qubo = {}
-    offset = 1
-    
-    # Create simple QUBO with diagonal elements
-    # Use positive values (higher = better)
-    for i in range(board_size):
-        var_name = f"('x{i}', 'x{i}')"
-        # Center is best, then corners, then edges
-        if i == 4:  # Center
-            qubo[var_name] = 9  # Highest weight
-        elif i in [0, 2, 6, 8]:  # Corners
-            qubo[var_name] = 7  # Second highest
-        else:  # Edges
-            qubo[var_name] = 5  # Lowest weight
-        
+    for n, i in enumerate(free):
+        qubo[(f"x{i}", f"x{i}")] = FALLBACK_POSITION_WEIGHTS[i] + FALLBACK_OUTCOME_WEIGHTS[outcomes[i]]
         # Add quadratic terms as penalties
-        for j in range(i+1, board_size):
-            qubo_key = f"('x{i}', 'x{j}')"
-            qubo[qubo_key] = -4  # Negative penalty for selecting multiple positions
-    
-    return qubo, offset
+        for j in free[n + 1:]:
+            qubo[(f"x{i}", f"x{j}")] = -4  # Negative penalty for selecting multiple positions
+    return qubo, {str(k): v for k, v in qubo.items()}
 
-@app.route('/quantum', methods=['POST'])
-def calculate():
+def create_fallback_qubo(board=None):
+    """Return the fallback strategy QUBO (higher weight = better move) and its offset.
+
+    Occupied cells of board are left out, and the free cells are weighted
+    by the precomputed minimax outcome of playing there.
+    """
+    log(logger, logging.DEBUG, "creating fallback QUBO")
+    qubo, _ = fallback_payload(tictactoe.parse_board(board))
+    return qubo, 1
+
+def compile_model(data):
+    """Compile a Blockly QUBO request, falling back to the classical strategy QUBO.
+
+    Returns (qubo, offset, explanation, cache_status) where qubo has
+    (label, label) tuple keys and cache_status is "HIT"/"MISS" for compiled
+    models and None for fallbacks. Fallback QUBOs are shared and must not
+    be modified.
+    """
+    board = data.get("board") if isinstance(data, dict) else None
     try:
-        print("\n--- New QUBO Request ---")
-        data = request.json
-        print("Received QUBO data:", json.dumps(data, indent=2))
-        
         # Track if we're using fallback and why
         using_fallback = False
         fallback_reason = ""
         original_data = None  # Store original QUBO for educational purposes
         
         if not data:
-            print("Error: No JSON data received, using fallback")
+            log(logger, logging.WARNING, "no JSON data received, using fallback")
             using_fallback = True
             fallback_reason = "No valid QUBO data received"
-            fallback_qubo, fallback_offset = create_fallback_qubo()
+            fallback_qubo, fallback_offset = create_fallback_qubo(board)
             
             explanation = {
                 "highlights": [
@@ -141,18 +235,14 @@ def calculate():
                 "using_fallback": True
             }
             
-            return jsonify({
-                'qubo': fallback_qubo, 
-                'offset': fallback_offset,
-                'explanation': explanation
-            }), 200
+            return fallback_qubo, fallback_offset, explanation, None
         
         # Check for required fields and provide helpful error messages
         if "variables" not in data or not data["variables"]:
-            print("Error: Missing or empty 'variables' field, using fallback")
+            log(logger, logging.WARNING, "missing or empty 'variables' field, using fallback")
             using_fallback = True
             fallback_reason = "Missing or empty 'variables' field"
-            fallback_qubo, fallback_offset = create_fallback_qubo()
+            fallback_qubo, fallback_offset = create_fallback_qubo(board)
             
             explanation = {
                 "highlights": [
@@ -167,29 +257,26 @@ def calculate():
                 "using_fallback": True
             }
             
-            return jsonify({
-                'qubo': fallback_qubo, 
-                'offset': fallback_offset,
-                'explanation': explanation
-            }), 200
+            return fallback_qubo, fallback_offset, explanation, None
         
         try:
             # Validate variable format
             for var_name, var_def in data["variables"].items():
                 if not isinstance(var_def, dict) or "type" not in var_def:
-                    print(f"Error: Invalid variable definition for {var_name}: {var_def}")
+                    log(logger, logging.WARNING, "invalid variable definition", variable=var_name)
                     using_fallback = True
                     fallback_reason = f"Invalid variable definition for {var_name}"
                     break
                 
-                if var_def["type"] not in ["Binary", "Spin"]:
-                    print(f"Error: Unsupported variable type: {var_def['type']}")
+                if var_def["type"] not in ["Binary", "Spin", "Array"]:
+                    log(logger, logging.WARNING, "unsupported variable type", variable=var_name,
+                        type=var_def['type'])
                     using_fallback = True
                     fallback_reason = f"Unsupported variable type: {var_def['type']}"
                     break
             
             if using_fallback:
-                fallback_qubo, fallback_offset = create_fallback_qubo()
+                fallback_qubo, fallback_offset = create_fallback_qubo(board)
                 explanation = {
                     "highlights": [
                         f"Using fallback QUBO: {fallback_reason}",
@@ -203,20 +290,29 @@ def calculate():
                     "using_fallback": True
                 }
                 
-                return jsonify({
-                    'qubo': fallback_qubo, 
-                    'offset': fallback_offset,
-                    'explanation': explanation
-                }), 200
+                return fallback_qubo, fallback_offset, explanation, None
             
-            # Parse quantum variables
-            variables = parse_variables(data.get("variables", {}))
-            if variables is None:
-                print("Error: Failed to parse variables")
+            # Serve repeat models without touching pyqubo
+            with stage("cache_lookup"):
+                cache_key = canonical_model_key(data)
+                cached = model_cache.get(cache_key)
+            if cached is not None:
+                qubo, offset, explanation = cached
+                log(logger, logging.INFO, "compiled model cache hit", terms=len(qubo))
+                return qubo, offset, explanation, "HIT"
+
+            # Compile expressions straight to coefficient dicts instead of eval
+            try:
+                with stage("parse"):
+                    compiler = ExpressionCompiler(data["variables"])
+            except ExpressionError as e:
+                log(logger, logging.WARNING, "failed to parse variables", error=str(e))
+                compiler = None
+            if compiler is None:
                 using_fallback = True
                 fallback_reason = "Failed to parse variables"
-                fallback_qubo, fallback_offset = create_fallback_qubo()
-                
+                fallback_qubo, fallback_offset = create_fallback_qubo(board)
+
                 explanation = {
                     "highlights": [
                         f"Using fallback QUBO: {fallback_reason}",
@@ -229,21 +325,17 @@ def calculate():
                     "user_qubo_data": data,
                     "using_fallback": True
                 }
-                
-                return jsonify({
-                    'qubo': fallback_qubo, 
-                    'offset': fallback_offset,
-                    'explanation': explanation
-                }), 200
-            
+
+                return fallback_qubo, fallback_offset, explanation, None
+
             # Parse constraints
-            constraints = parse_constraints(data.get("Constraints", []), variables)
+            with stage("parse"):
+                constraints = parse_constraints(data.get("Constraints", []), compiler)
             if constraints is None:
-                print("Error: Failed to parse constraints")
                 using_fallback = True
                 fallback_reason = "Failed to parse constraints"
-                fallback_qubo, fallback_offset = create_fallback_qubo()
-                
+                fallback_qubo, fallback_offset = create_fallback_qubo(board)
+
                 explanation = {
                     "highlights": [
                         f"Using fallback QUBO: {fallback_reason}",
@@ -256,21 +348,17 @@ def calculate():
                     "user_qubo_data": data,
                     "using_fallback": True
                 }
-                
-                return jsonify({
-                    'qubo': fallback_qubo, 
-                    'offset': fallback_offset,
-                    'explanation': explanation
-                }), 200
-            
+
+                return fallback_qubo, fallback_offset, explanation, None
+
             # Parse objective function
-            objective = parse_objective(data.get("Objective", "0"), variables)
+            with stage("parse"):
+                objective = parse_objective(data.get("Objective", "0"), compiler)
             if objective is None:
-                print("Error: Failed to parse objective function")
                 using_fallback = True
                 fallback_reason = "Failed to parse objective function"
-                fallback_qubo, fallback_offset = create_fallback_qubo()
-                
+                fallback_qubo, fallback_offset = create_fallback_qubo(board)
+
                 explanation = {
                     "highlights": [
                         f"Using fallback QUBO: {fallback_reason}",
@@ -283,92 +371,92 @@ def calculate():
                     "user_qubo_data": data,
                     "using_fallback": True
                 }
-                
-                return jsonify({
-                    'qubo': fallback_qubo, 
-                    'offset': fallback_offset,
-                    'explanation': explanation
-                }), 200
-            
-            # Add a dummy variable if objective is just a constant
-            if isinstance(objective, (int, float)):
-                print("Warning: Objective is a constant, adding dummy variables")
-                dummy_terms = 0
-                for var_name, var in variables.items():
-                    dummy_terms += 0 * var  # Won't affect the result
-                objective = objective + dummy_terms
-            
+
+                return fallback_qubo, fallback_offset, explanation, None
+
+            # Quadratic-or-lower Binary models are built directly without pyqubo
+            template = compiled_qubo = None
+            if not is_sparse_compatible(compiler, constraints, objective):
+                # Same structure as an earlier request: only the coefficients changed
+                model_polynomial = dict(objective)
+                for difference, weight in constraints:
+                    compiler.add(model_polynomial, compiler.power(difference, 2), weight)
+                template = ModelTemplate(data["variables"], model_polynomial)
+                compiled_qubo = template_cache.get(template.key)
+                if compiled_qubo is not None:
+                    log(logger, logging.INFO, "template cache hit", monomials=len(template.monomials))
+
             # Build final QUBO model
             try:
-                qubo_model = sum(constraints) + objective
-                compiled_qubo = qubo_model.compile()
-                qubo, offset = compiled_qubo.to_qubo()
+                if template is None:
+                    with stage("sparse_qubo"):
+                        qubo, offset = build_sparse_qubo(compiler.labels(), constraints, objective)
+                else:
+                    if compiled_qubo is None:
+                        with stage("compile"):
+                            variables = parse_variables(data.get("variables", {}))
+                            compiled_qubo = template.build_expression(variables).compile()
+                        template_cache.put(template.key, compiled_qubo)
+                    with stage("to_qubo"):
+                        qubo, offset = compiled_qubo.to_qubo(feed_dict=template.feed_dict)
                 
-                # Convert tuple keys to strings
-                qubo_str_keys = {str(k): v for k, v in qubo.items()}
+                # Drop terms whose coefficients cancelled
+                qubo = {k: v for k, v in qubo.items() if v != 0}
                 
                 # STEP 3: Check that QUBO has values
-                if not qubo_str_keys or len(qubo_str_keys) == 0:
-                    print("Warning: Empty QUBO generated, using fallback")
-                    fallback_qubo, fallback_offset = create_fallback_qubo()
-                    return jsonify({
-                        'qubo': fallback_qubo,
-                        'offset': fallback_offset,
-                        'explanation': {
-                            "highlights": ["Using fallback QUBO due to empty result"],
-                            "using_fallback": True,
-                            "method": "classical_fallback",
-                            "problem_type": "tic_tac_toe_strategy"
-                        }
-                    }), 200
+                if not qubo or len(qubo) == 0:
+                    log(logger, logging.WARNING, "empty QUBO generated, using fallback")
+                    fallback_qubo, fallback_offset = create_fallback_qubo(board)
+                    return fallback_qubo, fallback_offset, {
+                        "highlights": ["Using fallback QUBO due to empty result"],
+                        "using_fallback": True,
+                        "method": "classical_fallback",
+                        "problem_type": "tic_tac_toe_strategy"
+                    }, None
                 
                 # Simple analysis of the QUBO for educational purposes
                 explanation = {
                     "highlights": [],
                     "method": "quantum_annealing",
                     "problem_type": "binary_quadratic_optimization",
-                    "variable_count": len(variables),
-                    "constraint_count": len(constraints) if constraints else 0,
+                    "variable_count": len(data["variables"]),
+                    "constraint_count": len(constraints),
                     "using_fallback": False
                 }
                 
                 # Add analysis of the variables and optimal choice
-                if qubo_str_keys:
-                    # Find diagonal terms and convert negative to positive
-                    diags = {}
-                    for key, value in qubo_str_keys.items():
-                        if "'x" in key and ", 'x" not in key:  # It's a diagonal term
-                            var_match = key.replace("('", "").replace("')", "")
-                            var_idx = int(var_match.replace("x", ""))
-                            # Convert to positive value
-                            diags[var_idx] = abs(value)
+                if qubo:
+                    # Diagonal terms of the declared variables, as positive weights
+                    declared = set(compiler.labels())
+                    diags = {u: abs(value) for (u, v), value in qubo.items() if u == v and u in declared}
                     
                     # Find the maximum weight (optimal choice)
                     if diags:
-                        max_idx = max(diags.items(), key=lambda x: x[1])[0]
-                        max_value = diags[max_idx]
+                        max_label = max(diags, key=diags.get)
+                        max_value = diags[max_label]
+                        max_idx = board_cell(max_label)
                         
-                        explanation["highlights"].append(f"The optimal move is to position {max_idx}")
+                        if max_idx is None:
+                            explanation["highlights"].append(f"The optimal choice is {max_label}")
+                        else:
+                            explanation["highlights"].append(f"The optimal move is to position {max_idx}")
                         explanation["highlights"].append(f"This position has the highest score: {max_value}")
                         explanation["highlights"].append("Your quantum algorithm successfully found a solution")
                         explanation["highlights"].append("Higher weights indicate more desirable moves")
                 
-                print(f"Success! Generated QUBO with {len(qubo_str_keys)} terms")
-                return jsonify({
-                    'qubo': qubo_str_keys, 
-                    'offset': offset,
-                    'explanation': explanation
-                }), 200
+                log(logger, logging.INFO, "compiled QUBO", terms=len(qubo),
+                    builder="sparse" if template is None else "pyqubo")
+                model_cache.put(cache_key, (qubo, offset, explanation))
+                return qubo, offset, explanation, "MISS"
                 
             except Exception as e:
-                print(f"QUBO compilation error: {str(e)}")
-                traceback.print_exc()
+                log(logger, logging.ERROR, "QUBO compilation error", exc_info=True, error=str(e))
                 
                 using_fallback = True
                 fallback_reason = f"QUBO compilation error: {str(e)}"
                 original_data = data  # Store original data for educational purposes
                 
-                fallback_qubo, fallback_offset = create_fallback_qubo()
+                fallback_qubo, fallback_offset = create_fallback_qubo(board)
                 
                 explanation = {
                     "highlights": [
@@ -380,26 +468,20 @@ def calculate():
                     "problem_type": "tic_tac_toe_strategy",
                     "user_qubo_error": fallback_reason,
                     "user_qubo_data": {
-                        "variables": list(variables.keys()) if variables else [],
+                        "variables": list(data["variables"].keys()),
                         "objective": str(objective) if objective else "None",
                         "constraints": [str(c) for c in constraints] if constraints else []
                     },
                     "using_fallback": True
                 }
                 
-                return jsonify({
-                    'qubo': fallback_qubo, 
-                    'offset': fallback_offset,
-                    'explanation': explanation
-                }), 200
+                return fallback_qubo, fallback_offset, explanation, None
             
         except Exception as e:
-            print(f"Processing error: {e}")
-            traceback.print_exc()
+            log(logger, logging.ERROR, "processing error, using fallback", exc_info=True, error=str(e))
             
             # Instead of returning error, provide a fallback QUBO
-            fallback_qubo, fallback_offset = create_fallback_qubo()
-            print("Using fallback QUBO due to error")
+            fallback_qubo, fallback_offset = create_fallback_qubo(board)
             
             explanation = {
                 "highlights": [
@@ -414,19 +496,13 @@ def calculate():
                 "using_fallback": True
             }
             
-            return jsonify({
-                'qubo': fallback_qubo, 
-                'offset': fallback_offset,
-                'explanation': explanation
-            }), 200
+            return fallback_qubo, fallback_offset, explanation, None
 
     except Exception as e:
-        print(f"Unexpected error: {e}")
-        traceback.print_exc()
+        log(logger, logging.ERROR, "unexpected error, using fallback", exc_info=True, error=str(e))
         
         # Generate a fallback QUBO instead of returning an error
-        fallback_qubo, fallback_offset = create_fallback_qubo()
-        print("Using fallback QUBO due to unexpected error")
+        fallback_qubo, fallback_offset = create_fallback_qubo(board)
         
         explanation = {
             "highlights": [
@@ -440,11 +516,203 @@ def calculate():
             "using_fallback": True
         }
         
-        return jsonify({
-            'qubo': fallback_qubo, 
-            'offset': fallback_offset,
+        return fallback_qubo, fallback_offset, explanation, None
+
+def board_cell(label):
+    """Return the board cell a variable label names, e.g. x4, x[4] or q_11 -> 4, or None."""
+    match = ROW_COL_LABEL.match(label)
+    if match is not None:
+        return 3 * int(match.group(1)) + int(match.group(2))
+    match = CELL_LABEL.match(label)
+    if match is None:
+        return None
+    return int(match.group(1) or match.group(2))
+
+def board_cells(labels):
+    """Return {label: cell} if every label names a different board cell, else None."""
+    cells = {}
+    for label in labels:
+        cell = board_cell(label)
+        if cell is None or cell >= tictactoe.CELLS or cell in cells.values():
+            return None
+        cells[label] = cell
+    return cells
+
+def record_model(qubo, explanation, cache_status):
+    """Count a compiled model in the metrics by size, cache result and fallback reason."""
+    MODELS.inc(cache=cache_status or "none")
+    if explanation.get("using_fallback"):
+        error = explanation.get("user_qubo_error")
+        reason = "empty_qubo" if error is None else "error"
+        for prefix, label in FALLBACK_REASONS:
+            if error and error.startswith(prefix):
+                reason = label
+                break
+        FALLBACKS.inc(fallback_reason=reason)
+        return
+    MODEL_TERMS.observe(len(qubo))
+    MODEL_VARIABLES.observe(len({label for key in qubo for label in key}))
+
+def log_model_request(data):
+    """Log the size of a model request, and the full payload at DEBUG or when sampled."""
+    model = data if isinstance(data, dict) else {}
+    variables = model.get("variables")
+    constraints = model.get("Constraints")
+    fields = {
+        "variable_count": len(variables) if isinstance(variables, dict) else 0,
+        "constraint_count": len(constraints) if isinstance(constraints, list) else 0,
+        "request_bytes": request.content_length or 0,
+    }
+    if should_log_payload(logger):
+        fields["payload"] = data
+    log(logger, logging.INFO, "model request", **fields)
+
+def is_free(board, cell):
+    """Return True if the board has no piece at cell (or no board was sent)."""
+    if not board or cell >= len(board):
+        return True
+    return board[cell] in ("", None, 0, " ")
+
+def fallback_move(qubo, board=None):
+    """Pick the best move from the minimax table, or the highest-weight free cell.
+
+    The weights decide only when the board is missing or not a position
+    reachable in play.
+    """
+    cells = tictactoe.parse_board(board)
+    if cells is not None:
+        move = tictactoe.best_move(cells)
+        if move is not None:
+            return move
+    weights = {int(a[1:]): v for (a, b), v in qubo.items() if a == b}
+    free = [cell for cell in weights if is_free(board, cell)]
+    if not free:
+        return None
+    return max(free, key=lambda cell: weights[cell])
+
+def choose_move(sampleset, cells, board=None):
+    """Return (move, sample, energy) for the lowest-energy read that picks a free cell.
+
+    cells maps each variable label to the board cell it names, as built
+    by board_cells; within a read, lower cells are tried first.
+    """
+    ordered = sorted(cells.items(), key=lambda item: item[1])
+    for datum in sampleset.data(['sample', 'energy'], sorted_by='energy'):
+        sample = {str(k): int(v) for k, v in datum.sample.items()}
+        for label, cell in ordered:
+            if sample.get(label) == 1 and is_free(board, cell):
+                return cell, sample, float(datum.energy)
+    best = sampleset.first
+    return None, {str(k): int(v) for k, v in best.sample.items()}, float(best.energy)
+
+@app.route('/quantum', methods=['POST'])
+def calculate():
+    with stage("parse_request"):
+        data = read_body(request)
+    log_model_request(data)
+
+    qubo, offset, explanation, cache_status = compile_model(data)
+    record_model(qubo, explanation, cache_status)
+
+    fmt = response_format(request)
+    with stage("serialize"):
+        if fmt == JSON and explanation.get("using_fallback"):
+            # Same board as compile_model used; the string keys were built with the QUBO
+            board = data.get("board") if isinstance(data, dict) else None
+            encoded = fallback_payload(tictactoe.parse_board(board))[1]
+        elif fmt == JSON:
+            # Tuple keys are not valid JSON keys, so send them as strings like "('x0', 'x1')"
+            encoded = {str(k): v for k, v in qubo.items()}
+        else:
+            # Label table plus row/col/value arrays, negotiated through Accept
+            encoded = encode_qubo(qubo, fmt)
+
+        response = respond({
+            'qubo': encoded,
+            'offset': offset,
+            'explanation': explanation
+        }, fmt)
+    if cache_status:
+        response.headers['X-Cache'] = cache_status
+    return response, 200
+
+@app.route('/quantum/solve', methods=['POST'])
+def compile_and_solve():
+    """Compile the Blockly model and solve it in-process in one round trip."""
+    with stage("parse_request"):
+        data = read_body(request)
+    log_model_request(data)
+    board = data.get("board") if isinstance(data, dict) else None
+
+    qubo, offset, explanation, cache_status = compile_model(data)
+    explanation = dict(explanation)  # cached explanations are shared
+    move = energy = sample = None
+    if not explanation.get("using_fallback"):
+        # compile_model ranks cells by their largest weight, which is rarely the
+        # cell the lowest-energy read picks; describe the solved move instead
+        explanation["highlights"] = []
+
+    cells = None
+    if not explanation.get("using_fallback"):
+        cells = board_cells(ExpressionCompiler(data["variables"]).labels())
+        if cells is None:
+            # Picking cells by declaration order would play moves the model never meant
+            log(logger, logging.WARNING, "variables do not name board cells, using fallback",
+                variables=len(data["variables"]))
+            explanation["using_fallback"] = True
+            explanation["method"] = "classical_fallback"
+            explanation["user_qubo_error"] = ("Variables do not name board cells; "
+                                              "use labels like x4, x[4] or q_11")
+            qubo, offset = create_fallback_qubo(board)
+
+    if cells is not None:
+        try:
+            params = solver_params(data, num_reads=SOLVE_NUM_READS)
+            with stage("solve"):
+                sampleset = solve_qubo(qubo, offset, **params)
+            move, sample, energy = choose_move(sampleset, cells, board)
+            explanation["solver"] = sampleset.info.get("solver", "simulated_annealing")
+        except Exception as e:
+            log(logger, logging.ERROR, "solver error", exc_info=True, error=str(e))
+            explanation["using_fallback"] = True
+            explanation["method"] = "classical_fallback"
+            explanation["user_qubo_error"] = f"Solver error: {str(e)}"
+            qubo, offset = create_fallback_qubo(board)
+
+    if explanation.get("using_fallback"):
+        move = fallback_move(qubo, board)
+        explanation["solver"] = "classical_fallback"
+
+    highlights = list(explanation.get("highlights", []))
+    if explanation.get("using_fallback") and not highlights:
+        highlights.append(f"Using fallback QUBO: {explanation.get('user_qubo_error')}")
+    if move is not None:
+        highlights.append(f"The solver chose position {move}")
+        if energy is not None:
+            highlights.append(f"It is the lowest-energy read (energy {energy:g}) "
+                              "that places a piece on a free cell")
+    elif energy is not None:
+        highlights.append("No read placed a piece on a free cell")
+    explanation["highlights"] = highlights
+    record_model(qubo, explanation, cache_status)
+
+    with stage("serialize"):
+        response = jsonify({
+            'move': move,
+            'energy': energy,
+            'sample': sample,
             'explanation': explanation
-        }), 200
+        })
+    if cache_status:
+        response.headers['X-Cache'] = cache_status
+    return response, 200
+
+@app.route('/quantum/cache', methods=['GET', 'DELETE'])
+def cache_stats():
+    if request.method == 'DELETE':
+        model_cache.clear()
+        return jsonify({"message": "Compiled model cache cleared"}), 200
+    return jsonify(model_cache.stats()), 200
 
 @app.route('/api/workspaces', methods=['GET', 'POST'])
 def manage_workspaces():
@@ -454,7 +722,7 @@ def manage_workspaces():
             workspaces = ["example1", "example2"]  # Replace with actual logic
             return jsonify({"workspaces": workspaces}), 200
         except Exception as e:
-            print(f"Error listing workspaces: {e}")
+            log(logger, logging.ERROR, "error listing workspaces", error=str(e))
             return jsonify({"error": str(e)}), 500
     
     elif request.method == 'POST':
@@ -470,7 +738,7 @@ def manage_workspaces():
             # Save workspace logic here
             return jsonify({"message": f"Workspace '{name}' saved successfully"}), 201
         except Exception as e:
-            print(f"Error saving workspace: {e}")
+            log(logger, logging.ERROR, "error saving workspace", error=str(e))
             return jsonify({"error": str(e)}), 500
 
 @app.route('/api/workspaces/<workspace_name>', methods=['GET', 'DELETE'])
@@ -482,7 +750,7 @@ def workspace_operations(workspace_name):
             state = {"blocks": {}}
             return jsonify({"name": workspace_name, "state": state}), 200
         except Exception as e:
-            print(f"Error retrieving workspace: {e}")
+            log(logger, logging.ERROR, "error retrieving workspace", error=str(e))
             return jsonify({"error": str(e)}), 500
     
     elif request.method == 'DELETE':
@@ -491,8 +759,33 @@ def workspace_operations(workspace_name):
             # Delete logic here
             return jsonify({"message": f"Workspace '{workspace_name}' deleted successfully"}), 200
         except Exception as e:
-            print(f"Error deleting workspace: {e}")
+            log(logger, logging.ERROR, "error deleting workspace", error=str(e))
             return jsonify({"error": str(e)}), 500
 
+def warm_up():
+    """Compile and solve one model on each QUBO path so the first request skips the cold start."""
+    variables = {f"x{i}": {"type": "Binary"} for i in range(3)}
+    models = [
+        # Linear constraint: built by the sparse builder
+        {"variables": variables, "Constraints": [{"lhs": "x0 + x1 + x2", "comparison": "=", "rhs": 1}],
+         "Objective": "x0 - x1"},
+        # Quadratic constraint: compiled through pyqubo
+        {"variables": variables, "Constraints": [{"lhs": "x0 * x1 + x2", "comparison": "=", "rhs": 1}],
+         "Objective": "x0 - x1"},
+    ]
+    for model in models:
+        qubo, offset, _, _ = compile_model(model)
+        solve_qubo(qubo, offset, num_reads=1)
+    # Solve every Tic-Tac-Toe position and serialize the no-board fallback once
+    tictactoe.strategy_table()
+    create_fallback_qubo()
+    # Keep the warm-up models out of the caches and their hit rates
+    model_cache.clear()
+    template_cache.clear()
+
+health.init_app(app, warm_up=warm_up)
+
 if __name__ == '__main__':
+    # Development server; use serve.py for production
+    health.warm_up(app)
     app.run(debug=True, port=8000)
\ No newline at end of file
@@ -0,0 +1,216 @@
+import ast
+import io
+import tokenize
+
+# Guards against requests that would expand into huge polynomials
+MAX_EXPONENT = 8
+MAX_TERMS = 200000
+
+
+class ExpressionError(ValueError):
+    """Raised when an expression uses anything but arithmetic on declared variables."""
+
+
+def split_sum(expr):
+    """Split expr at its top-level + and - into (sign, term) pairs.
+
+    Returns None when expr cannot be tokenized or is a single term.
+    """
+    lines = expr.splitlines(keepends=True)
+    starts = [0]
+    for line in lines:
+        starts.append(starts[-1] + len(line))
+    try:
+        tokens = list(tokenize.generate_tokens(io.StringIO(expr).readline))
+    except (tokenize.TokenError, SyntaxError):
+        return None
+
+    terms, sign, begin, depth, previous = [], 1.0, 0, 0, None
+    for token in tokens:
+        if token.type == tokenize.OP and token.string in "([{":
+            depth += 1
+        elif token.type == tokenize.OP and token.string in ")]}":
+            depth -= 1
+        elif (token.type == tokenize.OP and token.string in ("+", "-") and depth == 0
+              and previous is not None
+              and (previous.type in (tokenize.NAME, tokenize.NUMBER) or previous.string in ")]}")):
+            # A binary operator: it follows an operand rather than another operator
+            offset = starts[token.start[0] - 1] + token.start[1]
+            terms.append((sign, expr[begin:offset]))
+            sign, begin = (-1.0 if token.string == "-" else 1.0), offset + 1
+        if token.type not in (tokenize.NL, tokenize.NEWLINE, tokenize.COMMENT,
+                              tokenize.INDENT, tokenize.DEDENT, tokenize.ENDMARKER):
+            previous = token
+    if not terms:
+        return None
+    terms.append((sign, expr[begin:]))
+    return terms
+
+
+class ExpressionCompiler:
+    """Compile Blockly expression strings into polynomial coefficient dicts.
+
+    A polynomial is a dict mapping a monomial (a sorted tuple of variable
+    labels, ``()`` for the constant term) to its coefficient. Binary variables
+    are idempotent (``x * x == x``) and spins square to one (``s * s == 1``),
+    so every monomial holds each label at most once.
+    """
+
+    def __init__(self, declarations):
+        self.names = {}   # scalar variable name -> label
+        self.arrays = {}  # array variable name -> size
+        self.spins = set()
+        for name, info in declarations.items():
+            var_type = info.get("type") if isinstance(info, dict) else None
+            if var_type == "Binary":
+                self.names[name] = name
+            elif var_type == "Spin":
+                self.names[name] = name
+                self.spins.add(name)
+            elif var_type == "Array":
+                self.arrays[name] = int(info.get("size", 10))
+            else:
+                raise ExpressionError(f"Unsupported variable type: {var_type}")
+
+    def labels(self):
+        """Return every variable label, in declaration order."""
+        labels = list(self.names)
+        for name, size in self.arrays.items():
+            labels.extend(f"{name}[{i}]" for i in range(size))
+        return labels
+
+    def compile(self, expr):
+        """Parse expr once and return its polynomial."""
+        if isinstance(expr, (int, float)) and not isinstance(expr, bool):
+            return {(): float(expr)} if expr else {}
+        if not isinstance(expr, str):
+            raise ExpressionError(f"Expected an expression string, got {type(expr).__name__}")
+        if expr.strip() == "":
+            return {}
+        try:
+            return self._visit(self._parse(expr))
+        except RecursionError:
+            # Python's own parser gives up on sums of a few thousand terms;
+            # those are compiled one top-level term at a time instead
+            terms = split_sum(expr)
+            if terms is None:
+                raise ExpressionError("Expression is nested too deeply") from None
+        result = {}
+        for sign, term in terms:
+            try:
+                self.add(result, self._visit(self._parse(term)), sign)
+            except RecursionError:
+                raise ExpressionError("Expression is nested too deeply") from None
+        return result
+
+    @staticmethod
+    def _parse(expr):
+        try:
+            return ast.parse(expr.strip(), mode="eval").body
+        except SyntaxError as e:
+            raise ExpressionError(f"Invalid syntax: {e.msg}") from None
+
+    def _visit(self, node):
+        if isinstance(node, ast.Constant):
+            if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+                raise ExpressionError(f"Unsupported constant: {node.value!r}")
+            return {(): float(node.value)}
+
+        if isinstance(node, ast.Name):
+            if node.id in self.names:
+                return {(self.names[node.id],): 1.0}
+            if node.id in self.arrays:
+                raise ExpressionError(f"Array '{node.id}' must be indexed, e.g. {node.id}[0]")
+            raise ExpressionError(f"Undefined variable: {node.id}")
+
+        if isinstance(node, ast.Subscript):
+            if not isinstance(node.value, ast.Name) or node.value.id not in self.arrays:
+                raise ExpressionError("Only declared Array variables can be indexed")
+            index = node.slice
+            if not isinstance(index, ast.Constant) or isinstance(index.value, bool) \
+                    or not isinstance(index.value, int):
+                raise ExpressionError("Array indices must be integer literals")
+            name = node.value.id
+            if not 0 <= index.value < self.arrays[name]:
+                raise ExpressionError(f"Index {index.value} out of range for '{name}'")
+            return {(f"{name}[{index.value}]",): 1.0}
+
+        if isinstance(node, ast.UnaryOp):
+            operand = self._visit(node.operand)
+            if isinstance(node.op, ast.UAdd):
+                return operand
+            if isinstance(node.op, ast.USub):
+                return self.scale(operand, -1.0)
+            raise ExpressionError(f"Unsupported operator: {type(node.op).__name__}")
+
+        if isinstance(node, ast.BinOp):
+            if isinstance(node.op, ast.Pow):
+                exponent = node.right
+                if not isinstance(exponent, ast.Constant) or isinstance(exponent.value, bool) \
+                        or not isinstance(exponent.value, int) \
+                        or not 0 <= exponent.value <= MAX_EXPONENT:
+                    raise ExpressionError(f"Exponents must be integers between 0 and {MAX_EXPONENT}")
+                return self.power(self._visit(node.left), exponent.value)
+
+            if isinstance(node.op, (ast.Add, ast.Sub)):
+                return self._visit_sum(node)
+
+            left = self._visit(node.left)
+            right = self._visit(node.right)
+            if isinstance(node.op, ast.Mult):
+                return self.multiply(left, right)
+            if isinstance(node.op, ast.Div):
+                if set(right) - {()} or not right.get((), 0):
+                    raise ExpressionError("Division is only allowed by a non-zero number")
+                return self.scale(left, 1.0 / right[()])
+            raise ExpressionError(f"Unsupported operator: {type(node.op).__name__}")
+
+        raise ExpressionError(f"Unsupported expression: {type(node).__name__}")
+
+    def _visit_sum(self, node):
+        """Compile a chain of + and - iteratively.
+
+        "a + b + c" parses as ((a + b) + c), so a long flat sum is a deep
+        left spine; recursing down it would hit the recursion limit at
+        around a thousand terms.
+        """
+        terms = []
+        while isinstance(node, ast.BinOp) and isinstance(node.op, (ast.Add, ast.Sub)):
+            terms.append((node.right, -1.0 if isinstance(node.op, ast.Sub) else 1.0))
+            node = node.left
+        result = self._visit(node)
+        for term, sign in reversed(terms):
+            self.add(result, self._visit(term), sign)
+        return result
+
+    def add(self, left, right, factor=1.0):
+        """Add factor * right into left in place and return left."""
+        for monomial, coeff in right.items():
+            left[monomial] = left.get(monomial, 0.0) + factor * coeff
+        return left
+
+    def scale(self, poly, factor):
+        return {monomial: coeff * factor for monomial, coeff in poly.items()}
+
+    def multiply(self, left, right):
+        result = {}
+        for m1, c1 in left.items():
+            for m2, c2 in right.items():
+                if not m1 or not m2:
+                    monomial = m1 or m2
+                else:
+                    common = set(m1) & set(m2)
+                    # Spins square to one, binaries are idempotent
+                    cancelled = {label for label in common if label in self.spins}
+                    monomial = tuple(sorted((set(m1) | set(m2)) - cancelled))
+                result[monomial] = result.get(monomial, 0.0) + c1 * c2
+            if len(result) > MAX_TERMS:
+                raise ExpressionError("Expression expands to too many terms")
+        return result
+
+    def power(self, poly, exponent):
+        result = {(): 1.0}
+        for _ in range(exponent):
+            result = self.multiply(result, poly)
+        return result
+
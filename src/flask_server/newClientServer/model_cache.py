@@ -0,0 +1,98 @@
+import ast
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_expression(expr):
+    """Return a whitespace/parenthesis independent form of an expression string."""
+    if not isinstance(expr, str):
+        return expr
+    try:
+        return ast.dump(ast.parse(expr.strip(), mode="eval"))
+    except (SyntaxError, RecursionError, ValueError):
+        # Unparseable or too deeply nested expressions still get a stable key
+        return expr.strip()
+
+
+def canonical_model_key(data):
+    """Hash the parts of a request that determine the compiled QUBO."""
+    constraints = []
+    for constraint in data.get("Constraints", []) or []:
+        if isinstance(constraint, dict):
+            constraint = dict(constraint)
+            constraint["lhs"] = normalize_expression(constraint.get("lhs", "0"))
+            constraint["rhs"] = normalize_expression(constraint.get("rhs", 0))
+        constraints.append(json.dumps(constraint, sort_keys=True))
+
+    canonical = {
+        "variables": data.get("variables", {}),
+        # The penalty terms are summed, so constraint order does not matter
+        "Constraints": sorted(constraints),
+        "Objective": normalize_expression(data.get("Objective", "0")),
+    }
+    payload = json.dumps(canonical, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CompiledModelCache:
+    """Thread-safe LRU cache with a maximum size and a time-to-live per entry."""
+
+    def __init__(self, max_size=256, ttl=3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Return the cached value for key, or None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            stored_at, value = entry
+            if self.ttl and time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                self.evictions += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Store value under key, evicting the least recently used entries."""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Return the counters as a JSON-serializable dict."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,49 @@
+import hashlib
+import json
+
+
+class ModelTemplate:
+    """The structure of a compiled model with its coefficients pulled out.
+
+    Built from the polynomial produced by ExpressionCompiler. Two requests
+    with the same ``key`` have the same variables and the same monomials, so
+    they compile to the same pyqubo model and only differ in ``feed_dict``.
+
+    Templates only cover the models that still go through pyqubo: Spin
+    variables or terms above quadratic (see sparse_qubo.is_sparse_compatible).
+    Quadratic Binary models, which includes every Tic-Tac-Toe board, are
+    built by build_sparse_qubo without pyqubo and never reach a template;
+    repeats of those are served by the compiled-model cache instead.
+    """
+
+    def __init__(self, declarations, polynomial):
+        self.monomials = sorted(polynomial)
+        self.feed_dict = {f"c{i}": float(polynomial[m]) for i, m in enumerate(self.monomials)}
+
+        structure = {"variables": declarations, "monomials": self.monomials}
+        payload = json.dumps(structure, sort_keys=True, separators=(",", ":"))
+        self.key = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def build_expression(self, variables):
+        """Return the pyqubo expression with one Placeholder coefficient per monomial."""
+        from pyqubo import Placeholder
+
+        labelled = {}
+        for name, var in variables.items():
+            if isinstance(var, list):
+                labelled.update({f"{name}[{i}]": element for i, element in enumerate(var)})
+            else:
+                labelled[name] = var
+
+        expression = 0
+        for i, monomial in enumerate(self.monomials):
+            term = Placeholder(f"c{i}")
+            for label in monomial:
+                term = term * labelled[label]
+            expression = expression + term
+
+        if not any(self.monomials):
+            # pyqubo cannot compile a bare constant; zero terms keep the result unchanged
+            for var in labelled.values():
+                expression = expression + 0 * var
+        return expression
@@ -0,0 +1,88 @@
+import numpy as np
+
+
+def degree(poly):
+    """Return the highest number of variables in any term of a polynomial."""
+    return max((len(monomial) for monomial in poly), default=0)
+
+
+def is_sparse_compatible(compiler, constraints, objective):
+    """Check whether a model can be built without pyqubo.
+
+    That is the case when every variable is Binary, every constraint is
+    linear (so its square is quadratic) and the objective is at most
+    quadratic. Spin models and higher-order terms still need pyqubo's
+    conversion and order reduction.
+    """
+    if compiler.spins:
+        return False
+    if any(degree(difference) > 1 for difference, _ in constraints):
+        return False
+    return degree(objective) <= 2
+
+
+def build_sparse_qubo(labels, constraints, objective):
+    """Build a QUBO dict and offset straight from coefficient arrays.
+
+    Each constraint is a ``(difference, weight)`` pair where difference is
+    ``c + sum(a_i * x_i)``. Its penalty ``weight * difference ** 2`` expands
+    analytically (using ``x_i ** 2 == x_i``) to::
+
+        c**2 + sum((a_i**2 + 2*c*a_i) * x_i) + sum_{i<j}(2 * a_i * a_j * x_i * x_j)
+
+    All contributions are accumulated as NumPy index/value arrays and summed
+    per variable or per pair in one pass at the end.
+    """
+    index = {label: i for i, label in enumerate(labels)}
+    n = len(labels)
+    offset = 0.0
+    linear_idx, linear_val = [], []
+    rows, cols, quad_val = [], [], []
+
+    for difference, weight in constraints:
+        const = difference.get((), 0.0)
+        terms = [(index[m[0]], coeff) for m, coeff in difference.items() if m]
+        offset += weight * const * const
+        if not terms:
+            continue
+
+        idx = np.fromiter((i for i, _ in terms), dtype=np.int64, count=len(terms))
+        coeffs = np.fromiter((c for _, c in terms), dtype=np.float64, count=len(terms))
+        linear_idx.append(idx)
+        linear_val.append(weight * (coeffs * coeffs + 2.0 * const * coeffs))
+
+        i, j = np.triu_indices(len(terms), k=1)
+        rows.append(idx[i])
+        cols.append(idx[j])
+        quad_val.append(2.0 * weight * coeffs[i] * coeffs[j])
+
+    for monomial, coeff in objective.items():
+        if len(monomial) == 0:
+            offset += coeff
+        elif len(monomial) == 1:
+            linear_idx.append(np.array([index[monomial[0]]], dtype=np.int64))
+            linear_val.append(np.array([coeff], dtype=np.float64))
+        else:
+            rows.append(np.array([index[monomial[0]]], dtype=np.int64))
+            cols.append(np.array([index[monomial[1]]], dtype=np.int64))
+            quad_val.append(np.array([coeff], dtype=np.float64))
+
+    qubo = {}
+    if linear_idx:
+        linear = np.bincount(np.concatenate(linear_idx),
+                             weights=np.concatenate(linear_val), minlength=n)
+        for i in np.flatnonzero(linear):
+            qubo[(labels[i], labels[i])] = float(linear[i])
+
+    if rows:
+        r = np.concatenate(rows)
+        c = np.concatenate(cols)
+        # Store each pair once, lower declaration index first
+        keys = np.minimum(r, c) * n + np.maximum(r, c)
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        sums = np.bincount(inverse, weights=np.concatenate(quad_val))
+        for key in np.flatnonzero(sums):
+            row, col = divmod(int(unique_keys[key]), n)
+            qubo[(labels[row], labels[col])] = float(sums[key])
+
+    return qubo, float(offset)
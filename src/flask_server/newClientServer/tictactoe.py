@@ -0,0 +1,165 @@
+"""Precomputed minimax table for every reachable Tic-Tac-Toe position.
+
+A board is nine cells read row by row, each empty, "X" or "O", with X
+moving first. Positions are indexed in base 3 (empty=0, X=1, O=2), so a
+lookup is one array access. Each entry packs the minimax value for the
+player to move and a bitmask of the moves that achieve it:
+
+    bit 15      reachable from the empty board
+    bits 9-10   value + 1 (0 = loss, 1 = draw, 2 = win for the player to move)
+    bits 0-8    best moves
+
+The table is built on first use in a few milliseconds, or loaded from
+TICTACTOE_TABLE (39 KB of little-endian uint16) when that file exists.
+"""
+import array
+import os
+import sys
+from functools import lru_cache
+
+CELLS = 9
+POSITIONS = 3 ** CELLS
+EMPTY, X, O = 0, 1, 2
+LINES = ((0, 1, 2), (3, 4, 5), (6, 7, 8), (0, 3, 6), (1, 4, 7), (2, 5, 8), (0, 4, 8), (2, 4, 6))
+POWERS = tuple(3 ** cell for cell in range(CELLS))
+# Tie-break between equally good moves: center, then corners, then edges
+POSITION_BONUS = (2, 1, 2, 1, 3, 1, 2, 1, 2)
+
+REACHABLE = 1 << 15
+VALUE_SHIFT = 9
+MOVES_MASK = (1 << CELLS) - 1
+
+TABLE_PATH = os.environ.get("TICTACTOE_TABLE")
+
+_PIECES = {"x": X, "o": O}
+_EMPTY_CELLS = ("", None, 0, " ")
+
+
+def winner(cells):
+    """Return X or O if that player has three in a row, else EMPTY."""
+    for a, b, c in LINES:
+        if cells[a] != EMPTY and cells[a] == cells[b] == cells[c]:
+            return cells[a]
+    return EMPTY
+
+
+def build_table():
+    """Solve every position reachable from the empty board by negamax."""
+    table = array.array("H", bytes(2 * POSITIONS))
+    cells = [EMPTY] * CELLS
+
+    def solve(index, player):
+        entry = table[index]
+        if entry:
+            return (entry >> VALUE_SHIFT & 3) - 1
+        if winner(cells) != EMPTY:
+            value, moves = -1, 0  # the previous move won
+        elif EMPTY not in cells:
+            value, moves = 0, 0
+        else:
+            value, moves = -2, 0
+            for cell in range(CELLS):
+                if cells[cell] != EMPTY:
+                    continue
+                cells[cell] = player
+                child = -solve(index + player * POWERS[cell], X + O - player)
+                cells[cell] = EMPTY
+                if child > value:
+                    value, moves = child, 1 << cell
+                elif child == value:
+                    moves |= 1 << cell
+        table[index] = REACHABLE | (value + 1) << VALUE_SHIFT | moves
+        return value
+
+    solve(0, X)
+    return table
+
+
+def save_table(table, path):
+    data = array.array("H", table)
+    if sys.byteorder != "little":
+        data.byteswap()
+    with open(path, "wb") as f:
+        data.tofile(f)
+
+
+def load_table(path):
+    """Return the table stored at path, or None if it is missing or the wrong size."""
+    data = array.array("H")
+    try:
+        with open(path, "rb") as f:
+            data.frombytes(f.read())
+    except FileNotFoundError:
+        return None
+    if len(data) != POSITIONS:
+        return None
+    if sys.byteorder != "little":
+        data.byteswap()
+    return data
+
+
+@lru_cache(maxsize=None)
+def strategy_table():
+    """Return the table, loading it from TABLE_PATH or building (and saving) it once."""
+    table = load_table(TABLE_PATH) if TABLE_PATH else None
+    if table is None:
+        table = build_table()
+        if TABLE_PATH:
+            save_table(table, TABLE_PATH)
+    return table
+
+
+def parse_board(board):
+    """Return the board as a tuple of EMPTY/X/O codes, or None if it is not a 3x3 board."""
+    if not isinstance(board, (list, tuple)) or len(board) != CELLS:
+        return None
+    cells = []
+    for cell in board:
+        if cell in _EMPTY_CELLS:
+            cells.append(EMPTY)
+        elif isinstance(cell, str) and cell.lower() in _PIECES:
+            cells.append(_PIECES[cell.lower()])
+        else:
+            return None
+    return tuple(cells)
+
+
+def board_index(cells):
+    return sum(code * power for code, power in zip(cells, POWERS))
+
+
+def player_to_move(cells):
+    return X if cells.count(X) == cells.count(O) else O
+
+
+def lookup(cells):
+    """Return (value, best moves) for the player to move, or None if unreachable."""
+    entry = strategy_table()[board_index(cells)]
+    if not entry:
+        return None
+    moves = entry & MOVES_MASK
+    return (entry >> VALUE_SHIFT & 3) - 1, [cell for cell in range(CELLS) if moves >> cell & 1]
+
+
+def move_values(cells):
+    """Return {free cell: outcome of playing there} for the player to move.
+
+    Outcomes are 1 (win), 0 (draw) or -1 (loss) under best play. Returns
+    None for unreachable or finished positions.
+    """
+    table = strategy_table()
+    index = board_index(cells)
+    entry = table[index]
+    if not entry or not entry & MOVES_MASK:
+        return None
+    player = player_to_move(cells)
+    return {cell: 1 - (table[index + player * POWERS[cell]] >> VALUE_SHIFT & 3)
+            for cell in range(CELLS) if cells[cell] == EMPTY}
+
+
+def best_move(cells):
+    """Return the best move, preferring the center, then corners, then edges."""
+    found = lookup(cells)
+    if not found or not found[1]:
+        return None
+    return max(found[1], key=lambda cell: POSITION_BONUS[cell])
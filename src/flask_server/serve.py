@@ -0,0 +1,130 @@
+"""Production entry point for server.py and TESTserver.py.
+
+    python serve.py server --workers 4 --threads 8
+    python serve.py testserver --bind 0.0.0.0:8000
+
+Runs under gunicorn (pip install gunicorn) with one pre-forked process per
+worker. Each worker imports the app and runs its warm-up compile and solve
+before it accepts connections, or with --warm-up background alongside
+serving, which gets a new worker to its first byte sooner.
+
+SIGTERM drains: /ready turns 503, in-flight requests get
+--graceful-timeout seconds to finish, then background jobs and process
+pools are stopped. Where gunicorn is unavailable (Windows), waitress is
+used as a single-process, multi-threaded fallback.
+"""
+import argparse
+import importlib
+import os
+import signal
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APPS = {
+    "server": (HERE, "server"),
+    "testserver": (os.path.join(HERE, "newClientServer"), "TESTserver"),
+}
+
+
+def load_app(name):
+    """Import the named app module and return its Flask app."""
+    directory, module = APPS[name]
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+    if HERE not in sys.path:
+        sys.path.insert(1, HERE)
+    return importlib.import_module(module).app
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a Flask app with warmed-up workers.")
+    parser.add_argument("app", choices=sorted(APPS))
+    parser.add_argument("--bind", default=os.environ.get("BIND", "0.0.0.0:8000"))
+    parser.add_argument("--workers", type=int,
+                        default=int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 1)))
+    parser.add_argument("--threads", type=int, default=int(os.environ.get("WEB_THREADS", 4)))
+    parser.add_argument("--timeout", type=int, default=int(os.environ.get("WEB_TIMEOUT", 60)),
+                        help="Seconds before a silent worker is restarted")
+    parser.add_argument("--graceful-timeout", type=int,
+                        default=int(os.environ.get("WEB_GRACEFUL_TIMEOUT", 30)),
+                        help="Seconds in-flight requests get to finish on shutdown")
+    parser.add_argument("--warm-up", choices=("blocking", "background"),
+                        default=os.environ.get("WARM_UP", "blocking"),
+                        help="Warm up before accepting connections, or on a background thread")
+    return parser.parse_args(argv)
+
+
+def run_gunicorn(args):
+    from gunicorn.app.base import BaseApplication
+
+    import health
+
+    def post_worker_init(worker):
+        if args.warm_up == "background":
+            health.warm_up_in_background(worker.wsgi)
+        else:
+            health.warm_up(worker.wsgi)
+        # gunicorn's own SIGTERM handler stops the accept loop; report not ready first
+        previous = signal.getsignal(signal.SIGTERM)
+
+        def on_term(signum, frame):
+            health.drain()
+            if callable(previous):
+                previous(signum, frame)
+
+        signal.signal(signal.SIGTERM, on_term)
+
+    def worker_exit(server, worker):
+        health.shutdown(worker.wsgi)
+
+    class Application(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", args.bind)
+            self.cfg.set("workers", args.workers)
+            self.cfg.set("threads", args.threads)
+            self.cfg.set("worker_class", "gthread")  # long SSE streams need threads
+            self.cfg.set("timeout", args.timeout)
+            self.cfg.set("graceful_timeout", args.graceful_timeout)
+            self.cfg.set("post_worker_init", post_worker_init)
+            self.cfg.set("worker_exit", worker_exit)
+
+        def load(self):
+            # Imported in each worker, not the master, so no imports are shared across fork
+            return load_app(args.app)
+
+    Application().run()
+
+
+def run_waitress(args):
+    from waitress import serve
+
+    import health
+
+    app = load_app(args.app)
+    if args.warm_up == "background":
+        health.warm_up_in_background(app)
+    else:
+        health.warm_up(app)
+    host, _, port = args.bind.rpartition(":")
+    try:
+        serve(app, host=host or "0.0.0.0", port=int(port), threads=args.threads)
+    finally:
+        health.shutdown(app)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        import gunicorn  # noqa: F401
+    except ImportError:
+        try:
+            import waitress  # noqa: F401
+        except ImportError:
+            sys.exit("serve.py needs gunicorn (or waitress on Windows): pip install gunicorn")
+        run_waitress(args)
+    else:
+        run_gunicorn(args)
+
+
+if __name__ == "__main__":
+    main()
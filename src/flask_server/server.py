@@ -1,64 +1,250 @@
 import sys
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
-from dimod import BinaryQuadraticModel
-from neal import SimulatedAnnealingSampler
+from jobs import JobQueue, QueueFull
+from solvers import (MAX_BATCH_SIZE, SOLVERS, cached_solve, shutdown_executor, solution_cache,
+                     solve_batch, solve_problem)
+from wire_format import read_body, respond, response_format
+from workspace_store import (MAX_PAGE_SIZE, UnsupportedOperation, VersionConflict, WorkspaceCache,
+                             WorkspaceNotFound, make_store)
+from json_patch import JsonPatchError
+import health
+import metrics
+import structured_logging
+from metrics import stage
+from structured_logging import get_logger
 import os
 import json
 
 app = Flask(__name__)
 CORS(app)
+metrics.init_app(app)
+logger = get_logger("server")
+structured_logging.init_app(app, logger)
 
-# Directory for storing workspace JSON files
+# Directory for workspace JSON files and the shipped minimax template
 WORKSPACE_DIR = "workspaces"
 os.makedirs(WORKSPACE_DIR, exist_ok=True)  # Create the directory if it doesn't exist
 
+# SQLite by default (WORKSPACE_BACKEND=file keeps one JSON file per workspace)
+workspace_store = make_store(WORKSPACE_DIR)
+workspace_cache = WorkspaceCache()
+
+# Every student loads this template when a session starts
+MINIMAX_PATH = os.path.join(WORKSPACE_DIR, "minimaxBlockly.json")
+
+
+def minimax_mtime():
+    try:
+        return os.stat(MINIMAX_PATH).st_mtime_ns / 1e9
+    except FileNotFoundError:
+        return None
+
+
+def load_minimax():
+    with open(MINIMAX_PATH, 'r') as f:
+        return json.load(f)
+
+
+def cached_workspace_response(key, mtime, load):
+    """Serve a workspace body from the cache, honouring If-None-Match/If-Modified-Since.
+
+    load() returns the response dict and is only called when the cached
+    body is missing or older than mtime.
+    """
+    cached = workspace_cache.get(key, mtime)
+    if cached is None:
+        body = json.dumps(load(), separators=(",", ":")).encode("utf-8")
+        cached = workspace_cache.put(key, mtime, body)
+
+    # The gzip form was compressed once when it was cached
+    if cached.gzipped is not None and request.accept_encodings['gzip'] > 0:
+        response = Response(cached.gzipped, mimetype='application/json')
+        response.headers['Content-Encoding'] = 'gzip'
+        response.set_etag(cached.etag + '-gzip')
+    else:
+        response = Response(cached.body, mimetype='application/json')
+        response.set_etag(cached.etag)
+    response.vary.add('Accept-Encoding')
+    response.last_modified = mtime
+    response.headers['Cache-Control'] = 'no-cache'  # always revalidate; a 304 is cheap
+    return response.make_conditional(request)
+
+
+def preload_minimax():
+    """Serialize the minimax template into the cache before the first request."""
+    mtime = minimax_mtime()
+    if mtime is not None:
+        body = json.dumps({"state": load_minimax()}, separators=(",", ":")).encode("utf-8")
+        workspace_cache.put("minimax", mtime, body)
+
+
+preload_minimax()
+
+# Background solves for models too large to answer within one request
+job_queue = JobQueue()
+
+
+def warm_up():
+    """Run every solver once so the first real request skips the cold start."""
+    problem = {"linear": {"0": 1, "1": -1}, "quadratic": {"0,1": 2}}
+    for solver in SOLVERS:
+        solve_problem(dict(problem, solver=solver, num_reads=1), use_cache=False)
+
+
+def shutdown():
+    job_queue.shutdown()
+    shutdown_executor()
+
+
+health.init_app(app, warm_up=warm_up, shutdown=shutdown)
+
 # Quantum calculation route
 @app.route('/quantum', methods=['POST'])
 def calculate():
-    data = request.json
+    # JSON or MessagePack; the problem is either linear/quadratic maps or
+    # the compact labels/row/col/value arrays
+    with stage("parse_request"):
+        data = read_body(request)
+    fmt = response_format(request)
 
-    # Initialize the linear and quadratic dictionaries
-    linear = {int(k): v for k, v in data["linear"].items()}
-    quadratic = {(int(k.split(',')[0]), int(k.split(',')[1])): v for k, v in data["quadratic"].items()}
+    # Optional num_reads/num_sweeps/beta_range/seed/time_limit/solver, clamped to server caps.
+    # Small models are enumerated exactly, larger ones annealed or tabu-searched.
+    # Repeats of the same model and parameters are answered from the solution cache.
+    try:
+        result, cache_status = cached_solve(data)
+    except ValueError as e:
+        return respond({"error": str(e)}, fmt, 400)
+
+    with stage("serialize"):
+        response = respond(result, fmt)
+    response.headers['X-Cache'] = cache_status
+    return response
+
+
+# Solution cache counters; DELETE empties it (and the shared on-disk store)
+@app.route('/quantum/cache', methods=['GET', 'DELETE'])
+def solution_cache_stats():
+    if request.method == 'DELETE':
+        solution_cache.clear()
+        return jsonify({"message": "Solution cache cleared"}), 200
+    return jsonify(solution_cache.stats()), 200
+
+
+# Solve many problems at once, spread across CPU cores
+@app.route('/quantum/batch', methods=['POST'])
+def calculate_batch():
+    with stage("parse_request"):
+        data = read_body(request)
+    fmt = response_format(request)
+    problems = data.get('problems') if isinstance(data, dict) else None
+
+    if not isinstance(problems, list):
+        return respond({"error": "Expected a 'problems' list"}, fmt, 400)
+    if len(problems) > MAX_BATCH_SIZE:
+        return respond({"error": f"At most {MAX_BATCH_SIZE} problems per batch"}, fmt, 400)
+
+    with stage("solve_batch"):
+        results = solve_batch(problems)
+    with stage("serialize"):
+        return respond({"results": results}, fmt)
+
+
+# Submit a long-running solve; poll /quantum/jobs/<id> or stream its events
+@app.route('/quantum/jobs', methods=['POST'])
+def submit_job():
+    try:
+        job = job_queue.submit(read_body(request))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except QueueFull as e:
+        return jsonify({"error": str(e)}), 503
 
-    # Create a Binary Quadratic Model (BQM)
-    bqm = BinaryQuadraticModel(linear, quadratic, 0.0, 'BINARY')
+    response = jsonify(job.snapshot())
+    response.headers['Location'] = f"/quantum/jobs/{job.id}"
+    return response, 202
 
-    # Solve the BQM using Simulated Annealing
-    sampler = SimulatedAnnealingSampler()
-    solution = sampler.sample(bqm)
 
-    solution_index = [int(k) for k, v in solution.first.sample.items() if v == 1]
-    solution_index = solution_index[0] if solution_index else None
+# Job status, including the best sample found so far
+@app.route('/quantum/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Job '{job_id}' not found"}), 404
+    return jsonify(job.snapshot()), 200
 
-    return jsonify({'solution': solution_index, 'energy': solution.first.energy}), 200
 
+# Server-Sent Events stream of the job's progress after every read
+@app.route('/quantum/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Job '{job_id}' not found"}), 404
+    response = Response(stream_with_context(job.events()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # keep reverse proxies from buffering the stream
+    return response
 
-# Save workspace route
+
+# Cancel a job; a running job stops after its current read
+@app.route('/quantum/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    job = job_queue.cancel(job_id)
+    if job is None:
+        return jsonify({"error": f"Job '{job_id}' not found"}), 404
+    return jsonify(job.snapshot()), 200
+
+
+def check_blockly_state(workspace_state):
+    """Raise ValueError unless workspace_state has the expected Blockly format."""
+    if not isinstance(workspace_state, dict) or "blocks" not in workspace_state:
+        raise ValueError("Invalid Blockly workspace format")
+
+
+# Save workspace route. The body is either {"name", "state"} for a full save
+# or {"name", "patch", "version"} with an RFC 6902 JSON Patch against that
+# version. A full save may also pass "version" to fail if someone else saved
+# first; version 0 means the workspace must not exist yet.
 @app.route('/api/workspaces', methods=['POST'])
 def save_workspace():
     try:
         data = request.json
         workspace_name = data.get('name')
         workspace_state = data.get('state')
+        patch = data.get('patch')
+        base_version = data.get('version')
+        owner = data.get('owner')
 
-        if not workspace_name or not workspace_state:
+        if not workspace_name or (not workspace_state and patch is None):
             return jsonify({"error": "Missing 'name' or 'state'"}), 400
+        if base_version is not None and (not isinstance(base_version, int) or isinstance(base_version, bool)):
+            return jsonify({"error": "'version' must be an integer"}), 400
 
-        # Ensure workspace_state has the expected Blockly format
-        if not isinstance(workspace_state, dict) or "blocks" not in workspace_state:
-            return jsonify({"error": "Invalid Blockly workspace format"}), 400
-
-        # Define file path for saving
-        file_path = os.path.join(WORKSPACE_DIR, f"{workspace_name}.json")
+        if patch is not None:
+            if base_version is None:
+                return jsonify({"error": "A patch needs the 'version' it was made against"}), 400
+            version, _ = workspace_store.patch(workspace_name, patch, base_version,
+                                               validate=check_blockly_state)
+        else:
+            check_blockly_state(workspace_state)
+            version = workspace_store.save(workspace_name, workspace_state, owner=owner,
+                                           expected_version=base_version)
+        workspace_cache.invalidate(f"workspace:{workspace_name}")
 
-        # Save workspace JSON to file
-        with open(file_path, 'w') as f:
-            json.dump(workspace_state, f, indent=4)  # Pretty-print JSON for readability
-
-        return jsonify({"message": f"Workspace '{workspace_name}' saved successfully"}), 200
+        body = {"message": f"Workspace '{workspace_name}' saved successfully"}
+        if version is not None:
+            body["version"] = version
+        return jsonify(body), 200
 
+    except VersionConflict as e:
+        # The client should reload, reapply its edit and retry
+        return jsonify({"error": str(e), "current_version": e.current_version}), 409
+    except WorkspaceNotFound:
+        return jsonify({"error": f"Workspace '{workspace_name}' not found"}), 404
+    except UnsupportedOperation as e:
+        return jsonify({"error": str(e)}), 501
+    except (JsonPatchError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -67,39 +253,48 @@ def save_workspace():
 @app.route('/api/workspaces/<workspace_name>', methods=['GET'])
 def load_workspace(workspace_name):
     try:
-        # Ensure Minimax workspace is preloaded
+        # The shared Minimax template is preloaded into the cache at startup
         if workspace_name.lower() == "minimax":
-            minimax_file = "minimaxBlockly.json"
-            minimax_path = os.path.join(WORKSPACE_DIR, minimax_file)
-
-            if not os.path.exists(minimax_path):
+            mtime = minimax_mtime()
+            if mtime is None:
                 return jsonify({"error": "Minimax workspace file not found"}), 404
+            return cached_workspace_response("minimax", mtime, lambda: {"state": load_minimax()})
 
-            with open(minimax_path, 'r') as f:
-                workspace_state = json.load(f)
-
-            return jsonify({"state": workspace_state}), 200
-
-        # Load regular workspaces
-        file_path = os.path.join(WORKSPACE_DIR, f"{workspace_name}.json")
-        if not os.path.exists(file_path):
+        # Load regular workspaces; the modification time validates the cached copy
+        mtime = workspace_store.mtime(workspace_name)
+        if mtime is None:
             return jsonify({"error": f"Workspace '{workspace_name}' not found"}), 404
 
-        with open(file_path, 'r') as f:
-            workspace_state = json.load(f)
+        def load():
+            loaded = workspace_store.load_versioned(workspace_name)
+            if loaded is None:
+                raise FileNotFoundError(f"Workspace '{workspace_name}' not found")
+            workspace_state, version = loaded
+            # Clients send the version back with their next patch
+            if version is None:
+                return {"state": workspace_state}
+            return {"state": workspace_state, "version": version}
 
-        return jsonify({"state": workspace_state}), 200
+        return cached_workspace_response(f"workspace:{workspace_name}", mtime, load)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
-# List all saved workspaces
+# List saved workspaces by name: all of them, or a page at a time with ?limit=&after=<last name>&owner=
 @app.route('/api/workspaces', methods=['GET'])
 def list_workspaces():
     try:
-        files = os.listdir(WORKSPACE_DIR)
-        workspaces = [os.path.splitext(file)[0] for file in files if file.endswith('.json')]
-        return jsonify({"workspaces": workspaces}), 200
+        limit = None
+        if 'limit' in request.args:
+            try:
+                limit = min(max(1, int(request.args['limit'])), MAX_PAGE_SIZE)
+            except ValueError:
+                return jsonify({"error": "'limit' must be an integer"}), 400
+        workspaces = workspace_store.list(limit=limit, after=request.args.get('after'),
+                                          owner=request.args.get('owner'))
+        # Pass 'next' back as 'after' to get the following page
+        next_after = workspaces[-1] if len(workspaces) == limit else None
+        return jsonify({"workspaces": workspaces, "next": next_after}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -107,15 +302,15 @@ def list_workspaces():
 @app.route('/api/workspaces/<workspace_name>', methods=['DELETE'])
 def delete_workspace(workspace_name):
     try:
-        file_path = os.path.join(WORKSPACE_DIR, f"{workspace_name}.json")
-
-        if not os.path.exists(file_path):
+        workspace_cache.invalidate(f"workspace:{workspace_name}")
+        if not workspace_store.delete(workspace_name):
             return jsonify({"error": f"Workspace '{workspace_name}' not found"}), 404
 
-        os.remove(file_path)
         return jsonify({"message": f"Workspace '{workspace_name}' deleted successfully"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 if __name__ == '__main__':
+    # Development server; use serve.py for production
+    health.warm_up(app)
     app.run(debug=True, port=8000)
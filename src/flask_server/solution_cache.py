@@ -0,0 +1,181 @@
+"""Cache of /quantum results keyed on the model and the solver parameters.
+
+The same board produces the same linear/quadratic maps, so repeated
+requests are answered without building or annealing the BQM again. Keys
+are a SHA-256 over the model with its variables sorted, so the order the
+terms were sent in does not matter.
+
+Each process keeps an LRU bounded by SOLUTION_CACHE_BYTES. When
+SOLUTION_CACHE_DB names a file, results are also written to a SQLite table
+there, which lets gunicorn workers and batch processes reuse each other's
+solves; the file keeps at most SOLUTION_CACHE_DB_ENTRIES results and drops
+the oldest first.
+
+A seeded solve is reproducible, so its cached answer is exactly what a
+fresh solve would return. Unseeded requests get the sample an earlier solve
+found. Results that hit their time limit are not cached.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from metrics import Counter
+
+SOLUTION_CACHE_BYTES = int(os.environ.get("SOLUTION_CACHE_BYTES", 16 * 1024 * 1024))
+SOLUTION_CACHE_DB = os.environ.get("SOLUTION_CACHE_DB")
+SOLUTION_CACHE_DB_ENTRIES = int(os.environ.get("SOLUTION_CACHE_DB_ENTRIES", 100000))
+# Trim the on-disk store after this many inserts rather than on every one
+PRUNE_EVERY = 256
+
+LOOKUPS = Counter("solution_cache_lookups_total", "Solution cache lookups, by result.", ("result",))
+
+
+def model_fingerprint(labels, linear, quadratic, params):
+    """Return a hex key for a model and its solver parameters.
+
+    labels are the integer variable labels, linear their biases and
+    quadratic (rows, cols, values) with rows and cols indexing into labels,
+    as returned by solvers.problem_arrays. Variables are sorted, each
+    interaction becomes (low, high) with duplicates summed, and zero
+    interactions are dropped, so the key does not depend on how the maps
+    were ordered or written.
+    """
+    rows, cols, values = quadratic
+    labels = np.asarray(labels, dtype=np.int64)
+    order = np.argsort(labels, kind="stable")
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    rows, cols = rank[rows], rank[cols]
+    pairs, inverse = np.unique(np.minimum(rows, cols) * len(labels) + np.maximum(rows, cols),
+                               return_inverse=True)
+    biases = np.bincount(inverse.ravel(), weights=values, minlength=len(pairs))
+    keep = biases != 0
+
+    digest = hashlib.sha256()
+    digest.update(json.dumps(params, sort_keys=True, separators=(",", ":")).encode("utf-8"))
+    # + 0.0 turns -0.0 into 0.0 so both hash alike
+    for array in (labels[order], np.asarray(linear, dtype=np.float64)[order] + 0.0,
+                  pairs[keep], biases[keep] + 0.0):
+        digest.update(np.ascontiguousarray(array).tobytes())
+        digest.update(b"|")
+    return digest.hexdigest()
+
+
+class SolutionCache:
+    """Thread-safe LRU of response bodies, bounded by their serialized size."""
+
+    def __init__(self, max_bytes=SOLUTION_CACHE_BYTES, db_path=SOLUTION_CACHE_DB,
+                 max_db_entries=SOLUTION_CACHE_DB_ENTRIES):
+        self.max_bytes = max_bytes
+        self.db_path = db_path
+        self.max_db_entries = max_db_entries
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._inserts = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if db_path:
+            with self._connect() as db:
+                db.execute("CREATE TABLE IF NOT EXISTS solutions ("
+                           "key TEXT PRIMARY KEY, body TEXT NOT NULL, stored_at REAL NOT NULL)")
+                db.execute("CREATE INDEX IF NOT EXISTS solutions_stored_at ON solutions (stored_at)")
+
+    def _connect(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.db_path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def get(self, key):
+        """Return the cached body for key, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        if entry is not None:
+            LOOKUPS.inc(result="hit")
+            return json.loads(entry)
+
+        row = None
+        if self.db_path:
+            row = self._connect().execute(
+                "SELECT body FROM solutions WHERE key = ?", (key,)).fetchone()
+        with self._lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        LOOKUPS.inc(result="miss" if row is None else "hit")
+        if row is None:
+            return None
+        self._remember(key, row[0])
+        return json.loads(row[0])
+
+    def put(self, key, body):
+        """Cache a JSON-serializable response body under key."""
+        serialized = json.dumps(body, separators=(",", ":"))
+        self._remember(key, serialized)
+        if not self.db_path:
+            return
+        with self._connect() as db:
+            db.execute("INSERT OR REPLACE INTO solutions VALUES (?, ?, ?)",
+                       (key, serialized, time.time()))
+            self._inserts += 1
+            if self._inserts % PRUNE_EVERY == 0:
+                db.execute("DELETE FROM solutions WHERE key IN (SELECT key FROM solutions "
+                           "ORDER BY stored_at DESC LIMIT -1 OFFSET ?)", (self.max_db_entries,))
+
+    def _remember(self, key, serialized):
+        size = len(key) + len(serialized)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(key) + len(previous)
+            self._entries[key] = serialized
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                evicted_key, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted_key) + len(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        """Empty this process's cache and the on-disk store."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if self.db_path:
+            with self._connect() as db:
+                db.execute("DELETE FROM solutions")
+
+    def stats(self):
+        """Return the counters as a JSON-serializable dict."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                "size": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+        if self.db_path:
+            stats["db_entries"] = self._connect().execute(
+                "SELECT COUNT(*) FROM solutions").fetchone()[0]
+        return stats
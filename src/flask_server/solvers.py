@@ -0,0 +1,424 @@
+import functools
+import math
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+from metrics import MODEL_TERMS, MODEL_VARIABLES, stage
+from solution_cache import SolutionCache, model_fingerprint
+from wire_format import decode_qubo
+
+# dimod, neal and dwave.samplers take most of a worker's startup time, so they
+# are imported on first use; the workspace endpoints never need them
+
+# Brute force is exact and deterministic, and 2**22 states still solve in a fraction of a second
+EXACT_MAX_VARIABLES = int(os.environ.get("EXACT_MAX_VARIABLES", 22))
+EXACT_BLOCK_CELLS = 1 << 20
+# Measured cost of enumeration, used to check it fits inside a caller's time budget
+EXACT_SECONDS_PER_STATE = 4e-8
+
+# Server-side caps on per-request solver parameters
+MAX_NUM_READS = int(os.environ.get("SOLVER_MAX_NUM_READS", 1000))
+MAX_NUM_SWEEPS = int(os.environ.get("SOLVER_MAX_NUM_SWEEPS", 100000))
+MAX_TIME_LIMIT = float(os.environ.get("SOLVER_MAX_TIME_LIMIT", 10.0))
+DEFAULT_NUM_SWEEPS = int(os.environ.get("SOLVER_DEFAULT_NUM_SWEEPS", 1000))
+SOLVERS = ("exact", "neal", "tabu")
+
+# Batch solves run in spawned worker processes: a sampler that crashes or runs out
+# of memory only takes down its worker (see BrokenProcessPool in solve_batch), each
+# worker keeps its own sampler instances, and the Python-side BQM building and
+# decoding around each anneal does not contend with request threads for the GIL
+BATCH_WORKERS = int(os.environ.get("BATCH_WORKERS", os.cpu_count() or 1))
+MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", 256))
+
+
+@functools.lru_cache(maxsize=None)
+def tabu_sampler_class():
+    """Return dwave.samplers.TabuSampler, or None if it is not installed."""
+    try:
+        from dwave.samplers import TabuSampler
+    except ImportError:  # dwave-samplers is only pulled in by newer dwave-neal releases
+        return None
+    return TabuSampler
+
+
+def _all_states(n):
+    """Return a (2**n, n) 0/1 matrix whose row i is the binary expansion of i."""
+    states = np.arange(1 << n, dtype=np.int64)
+    return ((states[:, None] >> np.arange(n, dtype=np.int64)) & 1).astype(np.float64)
+
+
+def solve_exact(bqm, num_reads=1):
+    """Enumerate every state of a small BQM and return the num_reads lowest.
+
+    The variables are split into a low and a high half. Each half's own
+    energy is computed once for its 2**(n/2) states, and the cross terms for
+    a block of high states are a single matrix product, so the full energy
+    table is built block by block as
+    ``E_low[:, None] + E_high[None, :] + (X_low @ J_cross) @ X_high.T``.
+    Only the best num_reads states are kept between blocks, and ties are
+    broken by state index so the result is deterministic.
+    """
+    from dimod import BINARY, SPIN, SampleSet
+
+    labels = list(bqm.variables)
+    n = len(labels)
+    vartype = bqm.vartype
+    if vartype is SPIN:
+        bqm = bqm.change_vartype(BINARY, inplace=False)
+
+    linear, (row, col, quad), offset = bqm.to_numpy_vectors(variable_order=labels)
+    coupling = np.zeros((n, n))
+    np.add.at(coupling, (row, col), quad)
+
+    n_low = n // 2
+    low = _all_states(n_low)
+    high = _all_states(n - n_low)
+    e_low = low @ linear[:n_low] + np.einsum("ij,ij->i", low @ coupling[:n_low, :n_low], low)
+    e_high = (high @ linear[n_low:]
+              + np.einsum("ij,ij->i", high @ coupling[n_low:, n_low:], high) + offset)
+    low_cross = low @ (coupling[:n_low, n_low:] + coupling[n_low:, :n_low].T)
+
+    k = max(1, min(int(num_reads), 1 << n))
+    block = max(1, EXACT_BLOCK_CELLS >> n_low)
+    low_index = np.arange(len(low), dtype=np.int64)
+    best_states = np.empty(0, dtype=np.int64)
+    best_energies = np.empty(0)
+
+    for start in range(0, len(high), block):
+        stop = min(start + block, len(high))
+        energies = e_low[:, None] + e_high[None, start:stop] + low_cross @ high[start:stop].T
+        states = low_index[:, None] + (np.arange(start, stop, dtype=np.int64)[None, :] << n_low)
+
+        states = np.concatenate([best_states, states.ravel()])
+        energies = np.concatenate([best_energies, energies.ravel()])
+        if len(energies) > k:
+            keep = np.argpartition(energies, k - 1)[:k]
+            states, energies = states[keep], energies[keep]
+        best_states, best_energies = states, energies
+
+    order = np.lexsort((best_states, best_energies))
+    bits = np.arange(n, dtype=np.int64)
+    samples = ((best_states[order][:, None] >> bits) & 1).astype(np.int8)
+    if vartype is SPIN:
+        samples = 2 * samples - 1
+
+    return SampleSet.from_samples((samples, labels), vartype=vartype,
+                                  energy=best_energies[order], info={"solver": "exact"})
+
+
+def choose_solver(num_variables, time_limit=None):
+    """Pick "exact", "tabu" or "neal" for a model of the given size.
+
+    Small models are enumerated exactly if that fits in the time limit.
+    Larger ones use simulated annealing, unless the caller gave a wall-clock
+    limit in seconds: tabu search stops at its timeout, while neal can only
+    be cut off between batches of reads.
+    """
+    if num_variables <= EXACT_MAX_VARIABLES and (
+            time_limit is None or (1 << num_variables) * EXACT_SECONDS_PER_STATE <= time_limit):
+        return "exact"
+    if time_limit is not None and tabu_sampler_class() is not None:
+        return "tabu"
+    return "neal"
+
+
+def solver_params(data, num_reads=1):
+    """Read and clamp the solver parameters of a request body.
+
+    Accepts num_reads, num_sweeps, beta_range ([hot, cold]), seed,
+    time_limit (seconds) and solver. Values above the server caps are
+    lowered to the cap; malformed values raise ValueError.
+    """
+    params = {"num_reads": num_reads, "num_sweeps": DEFAULT_NUM_SWEEPS}
+    if not isinstance(data, dict):
+        return params
+
+    if data.get("num_reads") is not None:
+        params["num_reads"] = min(max(1, int(data["num_reads"])), MAX_NUM_READS)
+    if data.get("num_sweeps") is not None:
+        params["num_sweeps"] = min(max(1, int(data["num_sweeps"])), MAX_NUM_SWEEPS)
+    if data.get("beta_range") is not None:
+        hot, cold = (float(beta) for beta in data["beta_range"])
+        if not 0 < hot <= cold:
+            raise ValueError("beta_range must be [hot, cold] with 0 < hot <= cold")
+        params["beta_range"] = [hot, cold]
+    if data.get("seed") is not None:
+        params["seed"] = int(data["seed"]) % (1 << 32)
+    if data.get("time_limit") is not None:
+        time_limit = float(data["time_limit"])
+        if not math.isfinite(time_limit) or time_limit <= 0:
+            raise ValueError("time_limit must be a positive number")
+        params["time_limit"] = min(time_limit, MAX_TIME_LIMIT)
+    if data.get("solver") is not None:
+        if data["solver"] not in SOLVERS:
+            raise ValueError(f"solver must be one of {', '.join(SOLVERS)}")
+        params["solver"] = data["solver"]
+    return params
+
+
+_local = threading.local()
+
+
+def get_sampler(name):
+    """Return this thread's long-lived sampler instance for name."""
+    samplers = getattr(_local, "samplers", None)
+    if samplers is None:
+        samplers = _local.samplers = {}
+    if name not in samplers:
+        if name == "tabu":
+            samplers[name] = tabu_sampler_class()()
+        else:
+            from neal import SimulatedAnnealingSampler
+            samplers[name] = SimulatedAnnealingSampler()
+    return samplers[name]
+
+
+def _sample_neal(bqm, num_reads, time_limit=None, **params):
+    """Run neal, stopping early once the next read would pass the time limit.
+
+    neal has no timeout of its own, so the first call is a single read that
+    measures the cost of a read; later batches are sized to fit the time left.
+    """
+    sampler = get_sampler("neal")
+    if time_limit is None:
+        return sampler.sample(bqm, num_reads=num_reads, **params)
+
+    deadline = time.monotonic() + time_limit
+    seed = params.pop("seed", None)
+    samplesets = []
+    done = 0
+    per_read = None
+    while done < num_reads:
+        now = time.monotonic()
+        if per_read is None:
+            batch = 1
+        else:
+            batch = min(num_reads - done, max(1, int((deadline - now) / per_read)))
+        if seed is not None:
+            params["seed"] = (seed + done) % (1 << 32)
+        samplesets.append(sampler.sample(bqm, num_reads=batch, **params))
+        per_read = (time.monotonic() - now) / batch
+        done += batch
+        if time.monotonic() + per_read > deadline:
+            break
+    from dimod import concatenate
+
+    sampleset = concatenate(samplesets)
+    sampleset.info["timed_out"] = done < num_reads
+    return sampleset
+
+
+def solve_bqm(bqm, solver=None, num_reads=1, time_limit=None, **params):
+    """Solve a BQM with the best solver for its size and return the SampleSet.
+
+    Extra params (num_sweeps, beta_range, seed) are passed to neal; tabu
+    only uses seed and spreads time_limit over its reads.
+    """
+    if solver == "exact" and len(bqm.variables) > EXACT_MAX_VARIABLES:
+        solver = None  # never enumerate more than the cap, even on request
+    if solver == "tabu" and tabu_sampler_class() is None:
+        solver = "neal"
+    solver = solver or choose_solver(len(bqm.variables), time_limit)
+
+    if solver == "exact":
+        return solve_exact(bqm, num_reads=num_reads)
+
+    if solver == "tabu":
+        timeout_ms = max(1, int(time_limit * 1000 / num_reads)) if time_limit else 100
+        sampleset = get_sampler("tabu").sample(bqm, timeout=timeout_ms, num_reads=num_reads,
+                                               seed=params.get("seed"))
+    else:
+        sampleset = _sample_neal(bqm, num_reads, time_limit, **params)
+
+    sampleset.info["solver"] = solver
+    return sampleset
+
+
+def solve_qubo(qubo, offset=0.0, **params):
+    """Solve a QUBO dict with (label, label) keys and return the SampleSet."""
+    from dimod import BinaryQuadraticModel
+
+    bqm = BinaryQuadraticModel.from_qubo(qubo, offset)
+    return solve_bqm(bqm, **params)
+
+
+def problem_arrays(problem):
+    """Return (labels, linear, (rows, cols, values)) for a problem in either form.
+
+    Accepts {"linear": {"0": h}, "quadratic": {"0,1": J}} or the compact
+    form from wire_format ({"labels", "row", "col", "value"}, diagonal
+    entries being linear biases). rows and cols index into labels, which
+    keep the order the variables first appear in.
+    """
+    if "row" in problem:
+        labels, rows, cols, values = decode_qubo(problem)
+        labels = [int(label) for label in labels]
+        diagonal = rows == cols
+        linear = np.bincount(rows[diagonal], weights=values[diagonal], minlength=len(labels))
+        off = ~diagonal
+        return labels, linear, (rows[off], cols[off], values[off])
+
+    linear_biases = {int(k): float(v) for k, v in problem["linear"].items()}
+    terms = []
+    for k, v in problem["quadratic"].items():
+        i, j = k.split(',')
+        terms.append((int(i), int(j), float(v)))
+    index = {label: n for n, label in enumerate(linear_biases)}
+    for i, j, _ in terms:
+        index.setdefault(i, len(index))
+        index.setdefault(j, len(index))
+    linear = np.zeros(len(index))
+    linear[[index[label] for label in linear_biases]] = list(linear_biases.values())
+    rows = np.array([index[i] for i, _, _ in terms], dtype=np.int64)
+    cols = np.array([index[j] for _, j, _ in terms], dtype=np.int64)
+    values = np.array([v for _, _, v in terms], dtype=np.float64)
+    return list(index), linear, (rows, cols, values)
+
+
+def arrays_to_bqm(labels, linear, quadratic):
+    from dimod import BINARY, BinaryQuadraticModel
+
+    return BinaryQuadraticModel.from_numpy_vectors(linear, quadratic, 0.0, BINARY,
+                                                   variable_order=labels)
+
+
+def problem_to_bqm(problem):
+    """Build a BINARY BQM from a problem in either form accepted by problem_arrays."""
+    return arrays_to_bqm(*problem_arrays(problem))
+
+
+def selected_index(sample):
+    """Return the first variable set to 1 in a sample, or None."""
+    selected = [int(k) for k, v in sample.items() if v == 1]
+    return selected[0] if selected else None
+
+
+def best_feasible(sampleset):
+    """Return (solution, energy, feasible_reads) over every read at once.
+
+    A read is feasible when exactly one variable is set, i.e. it names a
+    single move. solution is that variable for the lowest-energy feasible
+    read; if no read is feasible it falls back to the lowest-energy read
+    and its first selected variable, as selected_index does.
+    """
+    record = sampleset.record
+    selected = record.sample == 1
+    feasible = selected.sum(axis=1) == 1
+    if feasible.any():
+        best = int(np.argmin(np.where(feasible, record.energy, np.inf)))
+    else:
+        best = int(np.argmin(record.energy))
+    columns = np.flatnonzero(selected[best])
+    solution = int(sampleset.variables[columns[0]]) if len(columns) else None
+    return solution, float(record.energy[best]), int(feasible.sum())
+
+
+# Per process; SOLUTION_CACHE_DB shares results between processes
+solution_cache = SolutionCache()
+
+
+def solve_problem(problem, use_cache=True):
+    """Solve one linear/quadratic problem and return the response body.
+
+    Raises ValueError for malformed problems or solver parameters.
+    """
+    return cached_solve(problem, use_cache)[0]
+
+
+def cached_solve(problem, use_cache=True):
+    """Return (response body, "HIT" or "MISS") for one problem.
+
+    The BQM is only built on a miss. The status is None when use_cache is
+    off. Raises ValueError for malformed problems or solver parameters.
+    """
+    try:
+        with stage("build_bqm"):
+            params = solver_params(problem)
+            labels, linear, quadratic = problem_arrays(problem)
+            key = model_fingerprint(labels, linear, quadratic, params) if use_cache else None
+            cached = solution_cache.get(key) if use_cache else None
+            if cached is None:
+                bqm = arrays_to_bqm(labels, linear, quadratic)
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid problem: {e}") from None
+    MODEL_VARIABLES.observe(len(labels))
+    MODEL_TERMS.observe(len(labels) + len(quadratic[2]))
+    if cached is not None:
+        return cached, "HIT"
+
+    with stage("solve"):
+        solution = solve_bqm(bqm, **params)
+
+    with stage("score"):
+        selected, energy, feasible_reads = best_feasible(solution)
+    body = {
+        'solution': selected,
+        'energy': energy,
+        'solver': solution.info.get('solver'),
+        'timed_out': solution.info.get('timed_out', False),
+        'feasible': feasible_reads > 0,
+        'feasible_reads': feasible_reads,
+        'num_reads': len(solution)
+    }
+    if not use_cache:
+        return body, None
+    # A timed-out result depends on how busy the machine was
+    if not body['timed_out']:
+        solution_cache.put(key, body)
+    return body, "MISS"
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Return the shared process pool, starting it on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn rather than fork: forking a threaded Flask server can deadlock
+            _executor = ProcessPoolExecutor(max_workers=BATCH_WORKERS,
+                                            mp_context=multiprocessing.get_context("spawn"))
+        return _executor
+
+
+def shutdown_executor():
+    """Stop the process pool, cancelling batch items that have not started."""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True, cancel_futures=True)
+            _executor = None
+
+
+def solve_batch(problems):
+    """Solve problems across the process pool, returning results in order.
+
+    A problem that fails gets {"error": ...} in its slot instead of failing
+    the whole batch.
+    """
+    global _executor
+    executor = get_executor()
+    futures = [executor.submit(solve_problem, problem) for problem in problems]
+    results = []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except BrokenProcessPool as e:
+            # A worker died (e.g. out of memory); reap the broken pool and start
+            # a fresh one next time, unless another request already has
+            with _executor_lock:
+                if _executor is executor:
+                    _executor = None
+            executor.shutdown(wait=False, cancel_futures=True)
+            results.append({"error": f"Worker process failed: {e}"})
+        except Exception as e:
+            results.append({"error": str(e)})
+    return results
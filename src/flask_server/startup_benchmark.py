@@ -0,0 +1,91 @@
+"""Measure how long each server takes to start and answer its first request.
+
+    python startup_benchmark.py             # both apps, 5 fresh interpreters each
+    python startup_benchmark.py server --repeat 10 --json
+
+Every run is a new interpreter started with -X importtime, so nothing is
+shared between runs. The report gives the median over runs of the import
+time of each heavy module imported at startup (0 if it was deferred), the
+app import time, and the time to the first /healthz and /api/workspaces
+responses.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+MODULES = ("flask", "numpy", "dimod", "neal", "dwave.samplers", "pyqubo")
+APPS = ("server", "testserver")
+
+# Runs in the child interpreter; the timings go to stdout as one JSON line
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, {here!r})
+import serve
+app = serve.load_app({app!r})
+imported = time.perf_counter()
+client = app.test_client()
+client.get("/healthz")
+first = time.perf_counter()
+client.get("/api/workspaces")
+workspaces = time.perf_counter()
+print(json.dumps({{"import": imported - start, "healthz": first - start,
+                  "workspaces": workspaces - start}}))
+"""
+
+
+def parse_importtime(stderr):
+    """Return {module: cumulative seconds} from -X importtime output."""
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+def run_once(app):
+    env = dict(os.environ, LOG_LEVEL="WARNING")
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", PROBE.format(here=HERE, app=app)],
+                            capture_output=True, text=True, cwd=HERE, env=env, check=True)
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    modules = parse_importtime(result.stderr)
+    timings.update({f"import {name}": modules.get(name, 0.0) for name in MODULES})
+    return timings
+
+
+def benchmark(app, repeat):
+    """Return the median of each timing over repeat fresh interpreters."""
+    runs = [run_once(app) for _ in range(repeat)]
+    return {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("apps", nargs="*", help=f"Apps to measure: {', '.join(APPS)} (default: all)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args(argv)
+    unknown = set(args.apps) - set(APPS)
+    if unknown:
+        parser.error(f"unknown app: {', '.join(sorted(unknown))}")
+
+    results = {app: benchmark(app, args.repeat) for app in args.apps or APPS}
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    for app, timings in results.items():
+        print(f"{app} (median of {args.repeat} runs)")
+        for key, seconds in timings.items():
+            print(f"  {key:<24} {seconds * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import json
+import logging
+import os
+import random
+import sys
+import time
+import uuid
+
+from flask import g, has_request_context, request
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+# Fraction of requests whose full payload is logged at INFO; DEBUG logs them all
+LOG_PAYLOAD_SAMPLE_RATE = float(os.environ.get("LOG_PAYLOAD_SAMPLE_RATE", 0.0))
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line, with the request id if any."""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if has_request_context() and "request_id" in g:
+            entry["request_id"] = g.request_id
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def get_logger(name):
+    """Return a logger writing JSON lines to stderr at LOG_LEVEL."""
+    logger = logging.getLogger(name)
+    if not logger.handlers:
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(JsonFormatter())
+        logger.addHandler(handler)
+        logger.setLevel(LOG_LEVEL)
+        logger.propagate = False
+    return logger
+
+
+def log(logger, level, message, exc_info=False, **fields):
+    """Log message with extra JSON fields; nothing is built if level is disabled."""
+    if logger.isEnabledFor(level):
+        logger.log(level, message, exc_info=exc_info, extra={"fields": fields})
+
+
+def should_log_payload(logger):
+    """Return True if this request's full payload should be logged."""
+    if logger.isEnabledFor(logging.DEBUG):
+        return True
+    return LOG_PAYLOAD_SAMPLE_RATE > 0 and random.random() < LOG_PAYLOAD_SAMPLE_RATE
+
+
+def init_app(app, logger):
+    """Give every request an id (X-Request-ID) and log one summary line per request."""
+
+    @app.before_request
+    def assign_request_id():
+        g.request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+        g.log_start = time.perf_counter()
+
+    @app.after_request
+    def log_request(response):
+        if "request_id" not in g:
+            return response
+        response.headers["X-Request-ID"] = g.request_id
+        log(logger, logging.INFO, "request", method=request.method, path=request.path,
+            status=response.status_code, request_bytes=request.content_length or 0,
+            response_bytes=response.calculate_content_length(),
+            duration_ms=round((time.perf_counter() - g.log_start) * 1000, 3))
+        return response
@@ -0,0 +1,24 @@
+import threading
+
+import jobs
+from jobs import Job, run_job
+from solvers import problem_to_bqm, solver_params
+
+PROBLEM = {"linear": {"0": -1.0, "1": 0.5}, "quadratic": {"0,1": -2.0}, "num_reads": 3, "seed": 1}
+
+
+def test_unread_event_stream_does_not_block_the_job(monkeypatch):
+    monkeypatch.setattr(jobs, "EVENT_KEEPALIVE", 0.01)
+    job = Job(problem_to_bqm(PROBLEM), solver_params(PROBLEM))
+    events = job.events()
+    assert next(events).startswith("event: progress")
+    # Nothing changed within the keep-alive interval; the client then stops reading
+    assert next(events) == ": keep-alive\n\n"
+
+    worker = threading.Thread(target=run_job, args=(job,), daemon=True)
+    worker.start()
+    worker.join(timeout=10)
+
+    assert not worker.is_alive()
+    assert job.snapshot()["status"] == "done"
+    events.close()
@@ -0,0 +1,99 @@
+import copy
+
+import pytest
+
+from json_patch import JsonPatchError, apply_patch
+
+# RFC 6902 appendix A; A.13 (a duplicate "op" key) cannot survive JSON parsing
+APPLIES = {
+    "A.1 add object member": (
+        {"foo": "bar"},
+        [{"op": "add", "path": "/baz", "value": "qux"}],
+        {"baz": "qux", "foo": "bar"},
+    ),
+    "A.2 add array element": (
+        {"foo": ["bar", "baz"]},
+        [{"op": "add", "path": "/foo/1", "value": "qux"}],
+        {"foo": ["bar", "qux", "baz"]},
+    ),
+    "A.3 remove object member": (
+        {"baz": "qux", "foo": "bar"},
+        [{"op": "remove", "path": "/baz"}],
+        {"foo": "bar"},
+    ),
+    "A.4 remove array element": (
+        {"foo": ["bar", "qux", "baz"]},
+        [{"op": "remove", "path": "/foo/1"}],
+        {"foo": ["bar", "baz"]},
+    ),
+    "A.5 replace value": (
+        {"baz": "qux", "foo": "bar"},
+        [{"op": "replace", "path": "/baz", "value": "boo"}],
+        {"baz": "boo", "foo": "bar"},
+    ),
+    "A.6 move value": (
+        {"foo": {"bar": "baz", "waldo": "fred"}, "qux": {"corge": "grault"}},
+        [{"op": "move", "from": "/foo/waldo", "path": "/qux/thud"}],
+        {"foo": {"bar": "baz"}, "qux": {"corge": "grault", "thud": "fred"}},
+    ),
+    "A.7 move array element": (
+        {"foo": ["all", "grass", "cows", "eat"]},
+        [{"op": "move", "from": "/foo/1", "path": "/foo/3"}],
+        {"foo": ["all", "cows", "eat", "grass"]},
+    ),
+    "A.8 test value": (
+        {"baz": "qux", "foo": ["a", 2, "c"]},
+        [{"op": "test", "path": "/baz", "value": "qux"},
+         {"op": "test", "path": "/foo/1", "value": 2}],
+        {"baz": "qux", "foo": ["a", 2, "c"]},
+    ),
+    "A.10 add nested member object": (
+        {"foo": "bar"},
+        [{"op": "add", "path": "/child", "value": {"grandchild": {}}}],
+        {"foo": "bar", "child": {"grandchild": {}}},
+    ),
+    "A.11 ignore unrecognized elements": (
+        {"foo": "bar"},
+        [{"op": "add", "path": "/baz", "value": "qux", "xyz": 123}],
+        {"foo": "bar", "baz": "qux"},
+    ),
+    "A.14 escape ordering": (
+        {"/": 9, "~1": 10},
+        [{"op": "test", "path": "/~01", "value": 10}],
+        {"/": 9, "~1": 10},
+    ),
+    "A.16 add array value": (
+        {"foo": ["bar"]},
+        [{"op": "add", "path": "/foo/-", "value": ["abc", "def"]}],
+        {"foo": ["bar", ["abc", "def"]]},
+    ),
+}
+
+FAILS = {
+    "A.9 test value error": (
+        {"baz": "qux"},
+        [{"op": "test", "path": "/baz", "value": "bar"}],
+    ),
+    "A.12 add to nonexistent target": (
+        {"foo": "bar"},
+        [{"op": "add", "path": "/baz/bat", "value": "qux"}],
+    ),
+    "A.15 compare string and number": (
+        {"/": 9, "~1": 10},
+        [{"op": "test", "path": "/~01", "value": "10"}],
+    ),
+}
+
+
+@pytest.mark.parametrize("document, patch, expected", APPLIES.values(), ids=APPLIES.keys())
+def test_rfc6902_examples(document, patch, expected):
+    original = copy.deepcopy(document)
+
+    assert apply_patch(document, patch) == expected
+    assert document == original
+
+
+@pytest.mark.parametrize("document, patch", FAILS.values(), ids=FAILS.keys())
+def test_rfc6902_errors(document, patch):
+    with pytest.raises(JsonPatchError):
+        apply_patch(document, patch)
@@ -0,0 +1,59 @@
+import dimod
+import numpy as np
+import pytest
+
+import solvers
+from solvers import solve_exact
+
+
+def random_bqm(n, vartype, seed):
+    rng = np.random.default_rng(seed)
+    linear = {f"v{i}": rng.uniform(-2, 2) for i in range(n)}
+    quadratic = {(f"v{i}", f"v{j}"): rng.uniform(-2, 2)
+                 for i in range(n) for j in range(i + 1, n) if rng.random() < 0.6}
+    return dimod.BinaryQuadraticModel(linear, quadratic, rng.uniform(-1, 1), vartype)
+
+
+@pytest.mark.parametrize("vartype", [dimod.BINARY, dimod.SPIN])
+@pytest.mark.parametrize("n", [1, 2, 5, 8, 11])
+def test_solve_exact_matches_exact_solver(n, vartype):
+    bqm = random_bqm(n, vartype, seed=n)
+    expected = np.sort(dimod.ExactSolver().sample(bqm).record.energy)
+
+    sampleset = solve_exact(bqm, num_reads=10)
+
+    assert sampleset.vartype is vartype
+    np.testing.assert_allclose(sampleset.record.energy, expected[:10], atol=1e-9)
+    for sample, energy in sampleset.data(["sample", "energy"]):
+        assert bqm.energy(sample) == pytest.approx(energy)
+
+
+def test_solve_exact_merges_blocks(monkeypatch):
+    # Small blocks make the best states carry over between many blocks
+    monkeypatch.setattr(solvers, "EXACT_BLOCK_CELLS", 1 << 6)
+    bqm = random_bqm(12, dimod.BINARY, seed=3)
+    expected = np.sort(dimod.ExactSolver().sample(bqm).record.energy)
+
+    sampleset = solve_exact(bqm, num_reads=20)
+
+    np.testing.assert_allclose(sampleset.record.energy, expected[:20], atol=1e-9)
+
+
+def test_solve_exact_returns_every_state_when_asked_for_more():
+    bqm = random_bqm(3, dimod.BINARY, seed=0)
+
+    sampleset = solve_exact(bqm, num_reads=100)
+
+    assert len(sampleset) == 8
+    assert len({tuple(row) for row in sampleset.record.sample}) == 8
+
+
+@pytest.mark.parametrize("time_limit", [0, -1, "nan", float("nan"), float("inf"), "-inf"])
+def test_solver_params_rejects_bad_time_limits(time_limit):
+    with pytest.raises(ValueError, match="time_limit must be a positive number"):
+        solvers.solver_params({"time_limit": time_limit})
+
+
+def test_solver_params_caps_the_time_limit():
+    assert solvers.solver_params({"time_limit": 0.5})["time_limit"] == 0.5
+    assert solvers.solver_params({"time_limit": 1e9})["time_limit"] == solvers.MAX_TIME_LIMIT
@@ -0,0 +1,39 @@
+import re
+
+import pytest
+
+import TESTserver
+
+WEIGHTS = {(1, 1): 7, (0, 0): 3, (0, 2): 3, (2, 0): 3, (2, 2): 3}
+
+
+def quantum_tictactoe_model():
+    """The model WORKS_test_client sends, with its random weights fixed."""
+    cells = [(i, j) for i in range(3) for j in range(3)]
+    return {
+        "variables": {f"q_{i}{j}": {"type": "Binary"} for i, j in cells},
+        "Constraints": [{"lhs": f"q_{i}{j}", "comparison": "<=", "rhs": 1} for i, j in cells],
+        "Objective": " + ".join(f"{WEIGHTS.get((i, j), 2)} * q_{i}{j}" for i, j in cells),
+    }
+
+
+@pytest.fixture
+def client():
+    TESTserver.model_cache.clear()
+    return TESTserver.app.test_client()
+
+
+@pytest.mark.parametrize("board", [None, ["X", "", "", "", "O", "", "", "", ""]])
+def test_solve_highlights_name_the_chosen_move(client, board):
+    payload = dict(quantum_tictactoe_model(), seed=1)
+    if board is not None:
+        payload["board"] = board
+    # The first request compiles the model, the second is a cache hit
+    for _ in range(2):
+        body = client.post("/quantum/solve", json=payload).get_json()
+
+        assert body["move"] is not None
+        assert not body["explanation"]["using_fallback"]
+        highlights = " ".join(body["explanation"]["highlights"])
+        assert f"The solver chose position {body['move']}" in highlights
+        assert set(re.findall(r"position (\d)", highlights)) == {str(body["move"])}
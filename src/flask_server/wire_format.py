@@ -0,0 +1,121 @@
+import base64
+
+import numpy as np
+from flask import Response, jsonify
+from werkzeug.exceptions import UnsupportedMediaType
+
+try:
+    import msgpack
+except ImportError:  # optional; without it only the JSON formats are offered
+    msgpack = None
+
+JSON = "application/json"
+# Label table plus parallel row/col/value lists
+COMPACT_JSON = "application/vnd.qubo+json"
+# Same layout with row/col as base64 little-endian int32 and value as float32
+COMPACT_BASE64 = "application/vnd.qubo.b64+json"
+# Same layout with the arrays as raw little-endian bytes
+MSGPACK = "application/msgpack"
+MSGPACK_TYPES = (MSGPACK, "application/x-msgpack")
+
+INDEX_DTYPE = np.dtype("<i4")
+VALUE_DTYPE = np.dtype("<f4")
+
+
+def response_format(request):
+    """Pick the response media type from the request's Accept header."""
+    offered = [JSON, COMPACT_JSON, COMPACT_BASE64]
+    if msgpack is not None:
+        offered.extend(MSGPACK_TYPES)
+    return request.accept_mimetypes.best_match(offered, default=JSON)
+
+
+def read_body(request):
+    """Return the parsed request body, or None if it is missing or malformed.
+
+    MessagePack bodies are decoded when msgpack is installed; everything
+    else goes through Flask's JSON parsing, which covers the +json types.
+    """
+    if request.mimetype in MSGPACK_TYPES:
+        if msgpack is None:
+            raise UnsupportedMediaType("MessagePack support is not installed")
+        try:
+            return msgpack.unpackb(request.get_data(), raw=False, strict_map_key=False)
+        except (ValueError, msgpack.UnpackException):
+            return None
+    return request.get_json(silent=True, force=True)
+
+
+def respond(body, mimetype, status=200):
+    """Serialize body in the negotiated format and return a Response."""
+    if mimetype in MSGPACK_TYPES:
+        return Response(msgpack.packb(body, use_bin_type=True), status=status, mimetype=mimetype)
+    response = jsonify(body)
+    response.status_code = status
+    if mimetype != JSON:
+        response.mimetype = mimetype
+    return response
+
+
+def encode_qubo(qubo, mimetype, labels=None):
+    """Return a {(u, v): bias} QUBO as {"labels", "row", "col", "value"}.
+
+    row and col index into labels, and diagonal entries are the linear
+    biases. Labels default to the order they first appear in the QUBO.
+    The base64 and MessagePack forms round values to float32.
+    """
+    labels = list(labels) if labels is not None else []
+    index = {label: i for i, label in enumerate(labels)}
+    rows = np.empty(len(qubo), dtype=INDEX_DTYPE)
+    cols = np.empty(len(qubo), dtype=INDEX_DTYPE)
+    values = np.empty(len(qubo), dtype=np.float64)
+
+    for n, ((u, v), bias) in enumerate(qubo.items()):
+        for label in (u, v):
+            if label not in index:
+                index[label] = len(labels)
+                labels.append(label)
+        rows[n], cols[n], values[n] = index[u], index[v], bias
+
+    if mimetype == COMPACT_JSON:
+        return {"labels": labels, "row": rows.tolist(), "col": cols.tolist(),
+                "value": values.tolist()}
+
+    packed = [rows.tobytes(), cols.tobytes(), values.astype(VALUE_DTYPE).tobytes()]
+    if mimetype == COMPACT_BASE64:
+        packed = [base64.b64encode(array).decode("ascii") for array in packed]
+    return {"labels": labels, "row": packed[0], "col": packed[1], "value": packed[2]}
+
+
+def _array(field, dtype):
+    if isinstance(field, str):
+        return np.frombuffer(base64.b64decode(field, validate=True), dtype=dtype)
+    if isinstance(field, (bytes, bytearray)):
+        return np.frombuffer(field, dtype=dtype)
+    # Plain lists keep full precision
+    return np.asarray(field, dtype=np.float64 if dtype.kind == "f" else np.int64)
+
+
+def decode_qubo(payload):
+    """Inverse of encode_qubo; return (labels, row, col, value) arrays.
+
+    Accepts plain lists, base64 strings or raw bytes for each array.
+    labels may be omitted, in which case they are the indices themselves.
+    Raises ValueError for arrays of different lengths or bad indices.
+    """
+    try:
+        rows = _array(payload["row"], INDEX_DTYPE).astype(np.int64)
+        cols = _array(payload["col"], INDEX_DTYPE).astype(np.int64)
+        values = _array(payload["value"], VALUE_DTYPE).astype(np.float64)
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Malformed compact QUBO: {e}") from None
+
+    if not len(rows) == len(cols) == len(values):
+        raise ValueError("row, col and value must have the same length")
+    labels = payload.get("labels")
+    if labels is None:
+        labels = list(range(int(max(rows.max(), cols.max())) + 1)) if len(rows) else []
+    if len(rows) and (min(rows.min(), cols.min()) < 0
+                      or max(rows.max(), cols.max()) >= len(labels)):
+        raise ValueError("row/col index out of range of labels")
+    return list(labels), rows, cols, values
@@ -0,0 +1,441 @@
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+
+from json_patch import apply_patch
+
+try:
+    import zstandard
+except ImportError:  # optional; blobs are gzip-compressed without it
+    zstandard = None
+
+WORKSPACE_BACKEND = os.environ.get("WORKSPACE_BACKEND", "sqlite")
+WORKSPACE_DB = os.environ.get("WORKSPACE_DB", "workspaces.db")
+MAX_PAGE_SIZE = 1000
+# Parsed-and-serialized workspace bodies kept in memory
+WORKSPACE_CACHE_SIZE = int(os.environ.get("WORKSPACE_CACHE_SIZE", 512))
+WORKSPACE_CACHE_BYTES = int(os.environ.get("WORKSPACE_CACHE_BYTES", 64 * 1024 * 1024))
+# Smaller bodies are not worth a Content-Encoding: gzip response
+GZIP_MIN_BYTES = 1024
+# A patched workspace is written out in full after this many patches
+WORKSPACE_SNAPSHOT_EVERY = int(os.environ.get("WORKSPACE_SNAPSHOT_EVERY", 20))
+
+
+class VersionConflict(Exception):
+    """Raised when a save was based on a version that is no longer current."""
+
+    def __init__(self, current_version):
+        super().__init__(f"Workspace is at version {current_version}")
+        self.current_version = current_version
+
+
+class WorkspaceNotFound(LookupError):
+    """Raised when patching a workspace that does not exist."""
+
+
+class UnsupportedOperation(ValueError):
+    """Raised when the workspace backend cannot do what was asked, e.g. patch files."""
+
+
+def encode_state(state):
+    """Return the canonical minified JSON bytes of a workspace state.
+
+    Keys are sorted so identical workspaces hash to the same blob.
+    """
+    return json.dumps(state, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+
+def compress(raw):
+    """Return (codec, data) for raw bytes, using zstd when it is installed."""
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=10).compress(raw)
+    return "gzip", gzip.compress(raw, compresslevel=9, mtime=0)
+
+
+def decompress(codec, data):
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Workspace blob is zstd-compressed but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == "gzip":
+        return gzip.decompress(data)
+    return bytes(data)
+
+
+class FileWorkspaceStore:
+    """One <name>.json file per workspace in a directory."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name):
+        return os.path.join(self.directory, f"{name}.json")
+
+    def save(self, name, state, owner=None, expected_version=None):
+        """Write the workspace; files are not versioned, so this returns None."""
+        if expected_version is not None:
+            raise UnsupportedOperation("Versioned saves need the sqlite workspace backend")
+        # Write a temporary file and rename it over the old one, so readers
+        # and concurrent writers never see a half-written file
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(state, f, separators=(",", ":"))
+            os.replace(tmp_path, self._path(name))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def load(self, name):
+        """Return the workspace state, or None if there is no such workspace."""
+        try:
+            with open(self._path(name), "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def load_versioned(self, name):
+        """Return (state, None), or None if there is no such workspace."""
+        state = self.load(name)
+        return None if state is None else (state, None)
+
+    def patch(self, name, patch, expected_version, validate=None):
+        raise UnsupportedOperation("Patch saves need the sqlite workspace backend")
+
+    def mtime(self, name):
+        """Return the workspace's modification time in seconds, or None if missing."""
+        try:
+            return os.stat(self._path(name)).st_mtime_ns / 1e9
+        except FileNotFoundError:
+            return None
+
+    def list(self, limit=None, after=None, owner=None):
+        """Return up to limit names (all by default) sorted by name, starting after the given name.
+
+        Files carry no owner, so owner is ignored here.
+        """
+        names = sorted(os.path.splitext(file)[0] for file in os.listdir(self.directory)
+                       if file.endswith(".json"))
+        if after is not None:
+            names = [name for name in names if name > after]
+        return names[:limit]
+
+    def delete(self, name):
+        """Delete a workspace; return False if it did not exist."""
+        try:
+            os.remove(self._path(name))
+            return True
+        except FileNotFoundError:
+            return False
+
+
+class SQLiteWorkspaceStore:
+    """Workspaces in an embedded SQLite database in WAL mode.
+
+    States are stored once per distinct content as compressed blobs keyed
+    by their SHA-256, and each workspace name points at a blob, so copies
+    of the same template cost one row. Each thread gets its own connection;
+    a save is one transaction, and WAL lets reads run while it commits.
+
+    Every save bumps the workspace's version. A patch save only appends the
+    JSON Patch to workspace_patches; loads replay the patches made since
+    the last full snapshot, and every WORKSPACE_SNAPSHOT_EVERY patches the
+    state is written out as a new snapshot blob.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS blobs (
+            hash TEXT PRIMARY KEY,
+            codec TEXT NOT NULL,
+            data BLOB NOT NULL,
+            size INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS workspaces (
+            name TEXT PRIMARY KEY,
+            owner TEXT,
+            blob_hash TEXT NOT NULL REFERENCES blobs (hash),
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            version INTEGER NOT NULL DEFAULT 1,
+            snapshot_version INTEGER NOT NULL DEFAULT 1
+        );
+        CREATE TABLE IF NOT EXISTS workspace_patches (
+            name TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            patch TEXT NOT NULL,
+            PRIMARY KEY (name, version)
+        );
+        CREATE INDEX IF NOT EXISTS workspaces_owner_name ON workspaces (owner, name);
+        CREATE INDEX IF NOT EXISTS workspaces_updated_at ON workspaces (updated_at);
+        CREATE INDEX IF NOT EXISTS workspaces_blob_hash ON workspaces (blob_hash);
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        db = self._connect()
+        with db:
+            db.executescript(self.SCHEMA)
+
+    def _store_blob(self, db, raw):
+        """Insert raw unless a blob with the same hash exists; return the hash."""
+        digest = hashlib.sha256(raw).hexdigest()
+        if db.execute("SELECT 1 FROM blobs WHERE hash = ?", (digest,)).fetchone() is None:
+            codec, data = compress(raw)
+            db.execute("INSERT OR IGNORE INTO blobs VALUES (?, ?, ?, ?)",
+                       (digest, codec, data, len(raw)))
+        return digest
+
+    def _collect(self, db, digest):
+        """Delete a blob once no workspace points at it."""
+        db.execute("DELETE FROM blobs WHERE hash = ? AND NOT EXISTS "
+                   "(SELECT 1 FROM workspaces WHERE blob_hash = ?)", (digest, digest))
+
+    def _connect(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    @contextmanager
+    def _transaction(self, mode="DEFERRED"):
+        """Run a block in one transaction; IMMEDIATE takes the write lock up front."""
+        db = self._connect()
+        db.execute(f"BEGIN {mode}")
+        try:
+            yield db
+        except BaseException:
+            db.rollback()
+            raise
+        db.commit()
+
+    def _current(self, db, name):
+        """Return (state, version, snapshot_version, blob_hash), or None if missing."""
+        row = db.execute(
+            """SELECT workspaces.version, workspaces.snapshot_version, workspaces.blob_hash,
+                      blobs.codec, blobs.data
+               FROM workspaces JOIN blobs ON blobs.hash = workspaces.blob_hash
+               WHERE workspaces.name = ?""", (name,)).fetchone()
+        if row is None:
+            return None
+        version, snapshot_version, digest, codec, data = row
+        state = json.loads(decompress(codec, data))
+        patches = db.execute(
+            "SELECT patch FROM workspace_patches WHERE name = ? AND version > ? ORDER BY version",
+            (name, snapshot_version))
+        for (patch,) in patches:
+            state = apply_patch(state, json.loads(patch), in_place=True)
+        return state, version, snapshot_version, digest
+
+    def save(self, name, state, owner=None, expected_version=None):
+        """Store a full snapshot and return the new version.
+
+        Raises VersionConflict if expected_version is given and is not the
+        current version (0 for a workspace that does not exist yet).
+        """
+        raw = encode_state(state)
+        now = time.time()
+        with self._transaction("IMMEDIATE") as db:
+            previous = db.execute(
+                "SELECT version, blob_hash FROM workspaces WHERE name = ?", (name,)).fetchone()
+            current = previous[0] if previous else 0
+            if expected_version is not None and expected_version != current:
+                raise VersionConflict(current)
+
+            digest = self._store_blob(db, raw)
+            db.execute(
+                """INSERT INTO workspaces
+                       (name, owner, blob_hash, created_at, updated_at, version, snapshot_version)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (name) DO UPDATE SET
+                       owner = COALESCE(excluded.owner, owner),
+                       blob_hash = excluded.blob_hash,
+                       updated_at = excluded.updated_at,
+                       version = excluded.version,
+                       snapshot_version = excluded.snapshot_version""",
+                (name, owner, digest, now, now, current + 1, current + 1))
+            db.execute("DELETE FROM workspace_patches WHERE name = ?", (name,))
+            if previous is not None and previous[1] != digest:
+                self._collect(db, previous[1])
+        return current + 1
+
+    def patch(self, name, patch, expected_version, validate=None):
+        """Apply a JSON Patch to the current state and return (version, state).
+
+        validate(state), if given, may raise ValueError to reject the result.
+        Raises WorkspaceNotFound, VersionConflict or JsonPatchError, in
+        which case nothing is stored.
+        """
+        with self._transaction("IMMEDIATE") as db:
+            current = self._current(db, name)
+            if current is None:
+                raise WorkspaceNotFound(name)
+            state, version, snapshot_version, digest = current
+            if expected_version != version:
+                raise VersionConflict(version)
+
+            state = apply_patch(state, patch, in_place=True)
+            if validate is not None:
+                validate(state)
+            version += 1
+            now = time.time()
+            if version - snapshot_version >= WORKSPACE_SNAPSHOT_EVERY:
+                snapshot = self._store_blob(db, encode_state(state))
+                db.execute("UPDATE workspaces SET blob_hash = ?, version = ?, snapshot_version = ?, "
+                           "updated_at = ? WHERE name = ?", (snapshot, version, version, now, name))
+                db.execute("DELETE FROM workspace_patches WHERE name = ?", (name,))
+                if snapshot != digest:
+                    self._collect(db, digest)
+            else:
+                db.execute("INSERT INTO workspace_patches VALUES (?, ?, ?)",
+                           (name, version, json.dumps(patch, separators=(",", ":"))))
+                db.execute("UPDATE workspaces SET version = ?, updated_at = ? WHERE name = ?",
+                           (version, now, name))
+        return version, state
+
+    def load_versioned(self, name):
+        """Return (state, version), or None if there is no such workspace."""
+        # One read transaction, so the snapshot and its patches are consistent
+        with self._transaction() as db:
+            current = self._current(db, name)
+        return None if current is None else current[:2]
+
+    def load(self, name):
+        """Return the workspace state, or None if there is no such workspace."""
+        current = self.load_versioned(name)
+        return None if current is None else current[0]
+
+    def mtime(self, name):
+        """Return the workspace's last save time in seconds, or None if missing."""
+        row = self._connect().execute(
+            "SELECT updated_at FROM workspaces WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def list(self, limit=None, after=None, owner=None):
+        """Return up to limit names (all by default) sorted by name, starting after the given name."""
+        query = "SELECT name FROM workspaces WHERE 1 = 1"
+        params = []
+        if owner is not None:
+            query += " AND owner = ?"
+            params.append(owner)
+        if after is not None:
+            query += " AND name > ?"
+            params.append(after)
+        query += " ORDER BY name LIMIT ?"
+        # A negative LIMIT means no limit in SQLite
+        params.append(-1 if limit is None else limit)
+        return [row[0] for row in self._connect().execute(query, params)]
+
+    def delete(self, name):
+        """Delete a workspace; return False if it did not exist."""
+        with self._transaction("IMMEDIATE") as db:
+            row = db.execute("SELECT blob_hash FROM workspaces WHERE name = ?", (name,)).fetchone()
+            if row is None:
+                return False
+            db.execute("DELETE FROM workspaces WHERE name = ?", (name,))
+            db.execute("DELETE FROM workspace_patches WHERE name = ?", (name,))
+            self._collect(db, row[0])
+            return True
+
+    def storage_stats(self):
+        """Return workspace and blob counts with stored and uncompressed sizes."""
+        db = self._connect()
+        workspaces = db.execute("SELECT COUNT(*) FROM workspaces").fetchone()[0]
+        patches = db.execute("SELECT COUNT(*) FROM workspace_patches").fetchone()[0]
+        blobs, stored, size = db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0), COALESCE(SUM(size), 0) FROM blobs"
+        ).fetchone()
+        return {"workspaces": workspaces, "patches": patches, "blobs": blobs,
+                "stored_bytes": stored, "uncompressed_bytes": size}
+
+    def import_directory(self, directory):
+        """Copy <name>.json files from a file store into an empty database."""
+        if self._connect().execute("SELECT 1 FROM workspaces LIMIT 1").fetchone():
+            return 0
+        files = FileWorkspaceStore(directory)
+        names = files.list(limit=None)
+        for name in names:
+            state = files.load(name)
+            if state is not None:
+                self.save(name, state)
+        return len(names)
+
+
+# A response body, its ETag and its gzip-encoded form (None when too small to bother)
+CachedBody = namedtuple("CachedBody", ["body", "etag", "gzipped"])
+
+
+class WorkspaceCache:
+    """Thread-safe LRU of serialized workspace bodies, bounded by count and bytes.
+
+    Each entry remembers the modification time it was loaded at, and get()
+    only returns it while the caller's current mtime still matches, so saves
+    made by other worker processes are picked up too.
+    """
+
+    def __init__(self, max_size=WORKSPACE_CACHE_SIZE, max_bytes=WORKSPACE_CACHE_BYTES):
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, mtime):
+        """Return the CachedBody if key is cached at this mtime, else None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != mtime:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, mtime, body):
+        """Cache body (bytes) for key at mtime and return its CachedBody."""
+        gzipped = gzip.compress(body, compresslevel=6, mtime=0) if len(body) >= GZIP_MIN_BYTES else None
+        cached = CachedBody(body, hashlib.sha1(body).hexdigest(), gzipped)
+        if _entry_bytes(cached) > self.max_bytes:
+            return cached
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (mtime, cached)
+            self._bytes += _entry_bytes(cached)
+            while len(self._entries) > self.max_size or self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= _entry_bytes(evicted)
+        return cached
+
+    def invalidate(self, key):
+        with self._lock:
+            self._discard(key)
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= _entry_bytes(entry[1])
+
+
+def _entry_bytes(cached):
+    return len(cached.body) + len(cached.gzipped or b"")
+
+
+def make_store(directory, backend=WORKSPACE_BACKEND, db_path=WORKSPACE_DB):
+    """Return the configured store; a new SQLite store picks up existing JSON files."""
+    if backend == "file":
+        return FileWorkspaceStore(directory)
+    if backend != "sqlite":
+        raise ValueError(f"Unknown WORKSPACE_BACKEND: {backend}")
+    store = SQLiteWorkspaceStore(db_path)
+    if os.path.isdir(directory):
+        store.import_directory(directory)
+    return store